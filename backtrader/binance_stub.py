@@ -0,0 +1,115 @@
+import math
+import time
+import zlib
+import threading
+from kline_fetcher import INTERVAL_MS, to_ms
+
+KLINES_WEIGHT = 2
+
+class StubAPIError(Exception):
+    """Mimics BinanceAPIException for rate-limit responses"""
+
+    def __init__(self, status_code, message, retry_after=None):
+        super().__init__(f"APIError(code={status_code}): {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class FakeKlineServer:
+    """In-process kline endpoint with latency and a per-window weight limit.
+
+    Shared by many StubClient instances to benchmark the download scheduler
+    locally: requests over the limit fail with a 429 like the real API.
+    ``window`` can be shortened to make benchmarks run faster.
+    """
+
+    def __init__(self, weight_limit=6000, window=60.0, latency=0.05):
+        self.weight_limit = weight_limit
+        self.window = window
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.used_weight = 0
+        self.requests = 0
+        self.rejected = 0
+
+    def request(self, weight):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start = now
+                self.used_weight = 0
+            if self.used_weight + weight > self.weight_limit:
+                self.rejected += 1
+                raise StubAPIError(429, "Too many requests", retry_after=self.window - (now - self.window_start))
+            self.used_weight += weight
+            self.requests += 1
+        time.sleep(self.latency)
+
+class StubClient:
+    """Offline stand-in for binance.client.Client serving synthetic klines.
+
+    Prices are a deterministic function of (symbol, open time), so fetching
+    the same range twice returns identical rows, like the real API. Only the
+    methods used by this project are implemented.
+    """
+
+    def __init__(self, now_ms=None, listing_ms=None, base_price=100.0, server=None):
+        self.server = server
+        self.now_ms = now_ms
+        self.listing_ms = listing_ms if listing_ms is not None else to_ms('2017-07-14')
+        self.base_price = base_price
+        self.requests = 0
+
+    def _now(self):
+        return self.now_ms if self.now_ms is not None else int(time.time() * 1000)
+
+    def _price(self, symbol, ts):
+        noise = zlib.crc32(f"{symbol}:{ts}".encode()) / 0xFFFFFFFF - 0.5
+        return self.base_price * (1 + 0.2 * math.sin(ts / 86_400_000 / 30) + 0.01 * noise)
+
+    def make_kline(self, symbol, interval, open_time):
+        step = INTERVAL_MS[interval]
+        open_price = self._price(symbol, open_time)
+        close_price = self._price(symbol, open_time + step)
+        high = max(open_price, close_price) * 1.001
+        low = min(open_price, close_price) * 0.999
+        volume = 1 + (zlib.crc32(f"v{symbol}:{open_time}".encode()) % 1000) / 10
+        return [
+            open_time, f"{open_price:.8f}", f"{high:.8f}", f"{low:.8f}", f"{close_price:.8f}",
+            f"{volume:.8f}", open_time + step - 1, f"{volume * close_price:.8f}", 10,
+            f"{volume / 2:.8f}", f"{volume * close_price / 2:.8f}", "0"
+        ]
+
+    def get_server_time(self):
+        if self.server is not None:
+            self.server.request(1)
+        self.requests += 1
+        return {'serverTime': self._now()}
+
+    def get_klines(self, symbol, interval, startTime=None, endTime=None, limit=500):
+        if self.server is not None:
+            self.server.request(KLINES_WEIGHT)
+        self.requests += 1
+        step = INTERVAL_MS[interval]
+        now = self._now()
+        start = max(startTime if startTime is not None else self.listing_ms, self.listing_ms)
+        end = min(endTime if endTime is not None else now, now)
+        first = -(-start // step) * step  # prima open time allineata >= start
+        klines = []
+        t = first
+        while t <= end and len(klines) < limit:
+            klines.append(self.make_kline(symbol, interval, t))
+            t += step
+        return klines
+
+    def get_historical_klines(self, symbol, interval, start_str, end_str=None, limit=1000):
+        start = to_ms(start_str)
+        end = to_ms(end_str) if end_str is not None else self._now()
+        out = []
+        while start <= end:
+            page = self.get_klines(symbol, interval, startTime=start, endTime=end, limit=limit)
+            if not page:
+                break
+            out.extend(page)
+            start = page[-1][0] + 1
+        return out
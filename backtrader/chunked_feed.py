@@ -0,0 +1,55 @@
+import backtrader as bt
+from data_store import iter_blocks
+
+# bt.date2num(datetime(1970, 1, 1)): i timestamp in ms si convertono senza oggetti datetime
+EPOCH_DATE2NUM = 719163.0
+MS_PER_DAY = 86_400_000
+
+class ChunkedStoreData(bt.feed.DataBase):
+    """Backtrader feed streaming a data file from the columnar store block by block.
+
+    Only one block of `block_size` rows is held at a time; combined with
+    Cerebro(exactbars=1) memory stays flat regardless of history length.
+    Strategy and broker state are untouched between blocks, so open
+    positions carry over block boundaries. Timeframe/compression keep the
+    DataBase defaults, like bt.feeds.PandasData, so analyzer results match
+    the in-memory path.
+    """
+    params = (
+        ('filename', None),
+        ('block_size', 100_000),
+        ('start', None),
+        ('end', None),
+    )
+
+    def start(self):
+        super().start()
+        self._blocks = iter_blocks(self.p.filename, self.p.block_size, self.p.start, self.p.end)
+        self._block = None
+        self._idx = 0
+        self._len = 0
+
+    def _next_block(self):
+        block = next(self._blocks, None)
+        if block is None:
+            return False
+        self._dt = EPOCH_DATE2NUM + block['timestamp'] / MS_PER_DAY
+        self._block = block
+        self._idx = 0
+        self._len = len(self._dt)
+        return self._len > 0
+
+    def _load(self):
+        if self._idx >= self._len and not self._next_block():
+            return False
+        i = self._idx
+        block = self._block
+        self.lines.datetime[0] = self._dt[i]
+        self.lines.open[0] = block['open'][i]
+        self.lines.high[0] = block['high'][i]
+        self.lines.low[0] = block['low'][i]
+        self.lines.close[0] = block['close'][i]
+        self.lines.volume[0] = block['volume'][i]
+        self.lines.openinterest[0] = 0.0
+        self._idx += 1
+        return True
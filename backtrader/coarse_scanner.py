@@ -0,0 +1,90 @@
+import numpy as np
+try:
+    from numba import jit
+    numba_available = True
+except ImportError:
+    numba_available = False
+
+BLOCK_MS = 3_600_000  # blocchi orari
+
+def _scan(high, low, block_start, block_high, block_low, start, stop, upper, lower):
+    # Blocco che contiene start; i blocchi senza possibili hit si saltano interi
+    b = np.searchsorted(block_start, start, side='right') - 1
+    j = start
+    nblocks = len(block_start)
+    while j < stop:
+        end = block_start[b + 1] if b + 1 < nblocks else len(high)
+        if end > stop:
+            end = stop
+        if block_high[b] >= upper or block_low[b] <= lower:
+            for k in range(j, end):
+                if high[k] >= upper or low[k] <= lower:
+                    return k
+        j = end
+        b += 1
+    return -1
+
+def _scan_many(high, low, block_start, block_high, block_low, starts, stops, uppers, lowers):
+    out = np.empty(len(starts), dtype=np.int64)
+    for q in range(len(starts)):
+        out[q] = _scan(high, low, block_start, block_high, block_low, starts[q], stops[q], uppers[q], lowers[q])
+    return out
+
+if numba_available:
+    _scan = jit(nopython=True, cache=True)(_scan)
+    _scan_many = jit(nopython=True, cache=True)(_scan_many)
+
+class CoarseToFineScanner:
+    """Exact first-passage search that skips quiet blocks using their extremes.
+
+    Bars are grouped in blocks, either calendar periods of `block_ms`
+    (hourly by default, aligned like resampled klines) or `block_size`
+    consecutive rows. A query checks the block high/low first and scans the
+    single bars only inside blocks that can contain the crossing. Answers
+    are identical to FirstPassageIndex's first_passage/first_passages, with
+    one value per block of extra memory, so it can be passed as `index` to
+    run_fast_backtest, build_outcome_table and sweep. run_event_backtest
+    and simulate_hedge read the FirstPassageIndex block hierarchy directly
+    and do not accept it.
+    """
+
+    def __init__(self, high, low=None, timestamps=None, block_ms=BLOCK_MS, block_size=None):
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = self.high if low is None else np.ascontiguousarray(low, dtype=np.float64)
+        self.n = len(self.high)
+        if self.n == 0:
+            self.block_start = np.zeros(1, dtype=np.int64)
+            self.block_high = np.full(1, -np.inf)
+            self.block_low = np.full(1, np.inf)
+            return
+        if block_size is not None or timestamps is None:
+            self.block_start = np.arange(0, self.n, block_size or 60, dtype=np.int64)
+        else:
+            buckets = np.asarray(timestamps) // block_ms
+            self.block_start = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]]).astype(np.int64)
+        self.block_high = np.maximum.reduceat(self.high, self.block_start)
+        self.block_low = np.minimum.reduceat(self.low, self.block_start)
+
+    @classmethod
+    def from_arrays(cls, arrays, series='close', block_ms=BLOCK_MS):
+        """Scanner over stored OHLCV arrays: 'close' for close checks, 'highlow' for intrabar checks"""
+        if series == 'highlow':
+            return cls(arrays['high'], arrays['low'], timestamps=arrays['timestamp'], block_ms=block_ms)
+        return cls(arrays[series], timestamps=arrays['timestamp'], block_ms=block_ms)
+
+    def first_passage(self, start, stop=None, upper=np.inf, lower=-np.inf):
+        """First bar in [start, stop) reaching upper or lower, -1 if none"""
+        stop = self.n if stop is None else min(stop, self.n)
+        if start >= stop:
+            return -1
+        return int(_scan(self.high, self.low, self.block_start, self.block_high, self.block_low,
+                         int(start), int(stop), float(upper), float(lower)))
+
+    def first_passages(self, starts, stops=None, uppers=np.inf, lowers=-np.inf):
+        """Vectorized first_passage over arrays of queries (scalars are broadcast)"""
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.full(len(starts), self.n) if stops is None else np.asarray(stops)
+        starts, stops, uppers, lowers = np.broadcast_arrays(starts, np.minimum(stops, self.n), uppers, lowers)
+        return _scan_many(self.high, self.low, self.block_start, self.block_high, self.block_low,
+                          np.ascontiguousarray(starts, dtype=np.int64), np.ascontiguousarray(stops, dtype=np.int64),
+                          np.ascontiguousarray(uppers, dtype=np.float64), np.ascontiguousarray(lowers, dtype=np.float64))
@@ -0,0 +1,2 @@
+# old_files/ contiene script storici (test_*.py compresi) che non sono test pytest
+collect_ignore = ['old_files']
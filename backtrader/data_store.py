@@ -0,0 +1,357 @@
+import os
+import json
+import zlib
+import threading
+import datetime
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Colonne salvate nel data store e relativo tipo
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+DTYPES = {
+    'timestamp': np.int64,   # epoch in millisecondi
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+}
+CACHE_DIRNAME = '.cache'
+CATALOG_FILENAME = 'catalog.json'
+STORE_VERSION = 2
+
+_catalog_lock = threading.Lock()
+_catalog_cache = {}  # path -> (mtime_ns, catalogo)
+
+def get_store_dir(filename):
+    """Return the columnar store directory associated with a CSV file"""
+    base = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(os.path.dirname(filename), CACHE_DIRNAME, base)
+
+def _column_path(store_dir, column):
+    return os.path.join(store_dir, f"{column}.{np.dtype(DTYPES[column]).str[1:]}")
+
+def _meta_path(store_dir):
+    return os.path.join(store_dir, 'meta.json')
+
+def csv_fingerprint(filename):
+    """Size and mtime of the CSV, used to invalidate the store"""
+    st = os.stat(filename)
+    return {'csv_size': st.st_size, 'csv_mtime_ns': st.st_mtime_ns}
+
+def read_meta(filename):
+    try:
+        with open(_meta_path(get_store_dir(filename))) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def is_store_valid(filename):
+    meta = read_meta(filename)
+    if meta is None or meta.get('version') != STORE_VERSION:
+        return False
+    fp = csv_fingerprint(filename)
+    return meta['csv_size'] == fp['csv_size'] and meta['csv_mtime_ns'] == fp['csv_mtime_ns']
+
+def file_checksum(filename, start=0, crc=0):
+    """CRC32 of the file from byte `start`, continuing from a previous crc"""
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+def parse_data_filename(filename):
+    """('BTCUSDT', '1h') from 'csv/btcusdt_1h.csv', None for other names"""
+    parts = os.path.splitext(os.path.basename(filename))[0].split('_')
+    if len(parts) != 2:
+        return None
+    return parts[0].upper(), parts[1]
+
+def _bar_interval(ts):
+    if len(ts) < 2:
+        return None
+    return int(np.median(np.diff(ts)))
+
+def read_csv_arrays(filename):
+    """Parse the CSV once and return typed OHLCV arrays"""
+    df = pd.read_csv(filename, usecols=range(len(COLUMNS)))
+    ts = pd.to_datetime(df.iloc[:, 0]).values.astype('datetime64[ms]').astype(np.int64)
+    arrays = {'timestamp': ts}
+    for i, col in enumerate(COLUMNS[1:], start=1):
+        arrays[col] = df.iloc[:, i].to_numpy(dtype=DTYPES[col])
+    return arrays
+
+def build_store(filename, arrays=None, extra_meta=None):
+    """Convert the CSV into one raw binary file per column plus meta.json.
+
+    arrays can be passed when the caller just wrote the CSV from them, to
+    skip parsing it back; extra_meta is stored in meta.json and the catalog.
+    """
+    fp = csv_fingerprint(filename)
+    if arrays is None:
+        arrays = read_csv_arrays(filename)
+    store_dir = get_store_dir(filename)
+    os.makedirs(store_dir, exist_ok=True)
+    for col in COLUMNS:
+        path = _column_path(store_dir, col)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        np.ascontiguousarray(arrays[col], dtype=DTYPES[col]).tofile(tmp)
+        os.replace(tmp, path)
+    ts = arrays['timestamp']
+    meta = dict(fp, version=STORE_VERSION, rows=len(ts), columns=list(COLUMNS),
+                schema={col: np.dtype(DTYPES[col]).str for col in COLUMNS},
+                first_ts=int(ts[0]) if len(ts) else None,
+                last_ts=int(ts[-1]) if len(ts) else None,
+                interval_ms=_bar_interval(ts),
+                checksum=file_checksum(filename))
+    if extra_meta:
+        meta.update(extra_meta)
+    # meta.json va scritto per ultimo: la sua presenza rende valido lo store
+    _write_json(_meta_path(store_dir), meta)
+    update_catalog(filename, meta)
+    return meta
+
+def append_to_store(filename, arrays, previous_fingerprint):
+    """Append rows to the store right after the same rows were appended to the CSV.
+
+    previous_fingerprint is csv_fingerprint() taken before the CSV write: if
+    the store did not match it, nothing is done and the store is rebuilt on
+    the next load.
+    """
+    meta = read_meta(filename)
+    if (meta is None or meta.get('version') != STORE_VERSION
+            or meta['csv_size'] != previous_fingerprint['csv_size']
+            or meta['csv_mtime_ns'] != previous_fingerprint['csv_mtime_ns']):
+        return None
+    store_dir = get_store_dir(filename)
+    for col in COLUMNS:
+        with open(_column_path(store_dir, col), 'ab') as f:
+            np.ascontiguousarray(arrays[col], dtype=DTYPES[col]).tofile(f)
+    ts = np.asarray(arrays['timestamp'])
+    if len(ts):
+        if meta['first_ts'] is None:
+            meta['first_ts'] = int(ts[0])
+        if meta['interval_ms'] is None:
+            meta['interval_ms'] = _bar_interval(np.r_[meta['last_ts'] if meta['last_ts'] is not None else ts[:0], ts])
+        meta['last_ts'] = int(ts[-1])
+    # Il checksum si aggiorna leggendo solo i byte appena aggiunti
+    meta['checksum'] = file_checksum(filename, previous_fingerprint['csv_size'], meta['checksum'])
+    meta.update(csv_fingerprint(filename), rows=meta['rows'] + len(ts))
+    _write_json(_meta_path(store_dir), meta)
+    update_catalog(filename, meta)
+    return meta
+
+def to_epoch_ms(value, end_of_day=False):
+    """Epoch ms from an int (already ms), date string, date or datetime (UTC).
+
+    With end_of_day=True a plain date (no time) means its last millisecond,
+    so that a date range includes the whole final day.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if end_of_day and (isinstance(value, datetime.date) and not isinstance(value, datetime.datetime)
+                       or isinstance(value, str) and len(value) <= 10):
+        ts += pd.Timedelta(days=1) - pd.Timedelta(milliseconds=1)
+    return int(ts.value // 1_000_000)
+
+def slice_arrays(arrays, start=None, end=None):
+    """Rows with start <= timestamp <= end, found by binary search on the sorted timestamps.
+
+    On memory-mapped arrays only the pages of the selected rows (plus the few
+    touched by the search) are read from disk.
+    """
+    if start is None and end is None:
+        return arrays
+    lo, hi = row_range(arrays['timestamp'], start, end)
+    return {col: values[lo:hi] for col, values in arrays.items()}
+
+def row_range(ts, start=None, end=None):
+    """(lo, hi) row indices of the bars with start <= timestamp <= end"""
+    lo = 0 if start is None else int(np.searchsorted(ts, to_epoch_ms(start), side='left'))
+    hi = len(ts) if end is None else int(np.searchsorted(ts, to_epoch_ms(end, end_of_day=True), side='right'))
+    return lo, hi
+
+def data_fingerprint(filename):
+    """Checksum and row count of the data file (content identity), building the store if stale"""
+    meta = read_meta(filename) if is_store_valid(filename) else build_store(filename)
+    return {'checksum': meta['checksum'], 'rows': meta['rows']}
+
+def load_arrays(filename, start=None, end=None):
+    """Return memory-mapped OHLCV arrays for a CSV, building the store if stale.
+
+    start/end restrict the result to a date range (see slice_arrays).
+    """
+    meta = read_meta(filename) if is_store_valid(filename) else build_store(filename)
+    store_dir = get_store_dir(filename)
+    rows = meta['rows']
+    arrays = {}
+    for col in COLUMNS:
+        if rows == 0:
+            arrays[col] = np.empty(0, dtype=DTYPES[col])
+        else:
+            arrays[col] = np.memmap(_column_path(store_dir, col), dtype=DTYPES[col], mode='r', shape=(rows,))
+    return slice_arrays(arrays, start, end)
+
+def iter_blocks(filename, block_size, start=None, end=None):
+    """Yield the rows of a data file in consecutive blocks of at most block_size.
+
+    Blocks are read with plain file reads instead of mapping the columns, so
+    memory stays bounded by the block size whatever the history length.
+    """
+    lo, hi = row_range(load_arrays(filename)['timestamp'], start, end)
+    store_dir = get_store_dir(filename)
+    for first in range(lo, hi, block_size):
+        count = min(block_size, hi - first)
+        yield {col: np.fromfile(_column_path(store_dir, col), dtype=DTYPES[col], count=count,
+                                offset=first * np.dtype(DTYPES[col]).itemsize)
+               for col in COLUMNS}
+
+def arrays_to_dataframe(arrays):
+    """Build the DataFrame expected by bt.feeds.PandasData"""
+    index = pd.DatetimeIndex(pd.to_datetime(np.asarray(arrays['timestamp']), unit='ms'), name='datetime')
+    # copy=False: le colonne restano viste sulla memoria mappata/condivisa
+    return pd.DataFrame({col: np.asarray(arrays[col]) for col in COLUMNS[1:]}, index=index, copy=False)
+
+def load_dataframe(filename, start=None, end=None):
+    return arrays_to_dataframe(load_arrays(filename, start, end))
+
+def get_catalog_path(data_dir):
+    return os.path.join(data_dir, CATALOG_FILENAME)
+
+@contextmanager
+def _locked_catalog(path):
+    """Exclusive access to catalog.json across threads and processes (lock file next to it)"""
+    with _catalog_lock, open(f"{path}.lock", 'a+b') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+def update_catalog(filename, meta):
+    """Record the metadata of a data file in <data_dir>/catalog.json"""
+    names = parse_data_filename(filename)
+    if names is None:
+        return
+    path = get_catalog_path(os.path.dirname(filename))
+    entry = {key: meta[key] for key in ('rows', 'first_ts', 'last_ts', 'interval_ms', 'checksum',
+                                        'schema', 'csv_size', 'csv_mtime_ns')}
+    entry.update(symbol=names[0], timeframe=names[1], filename=filename)
+    if 'source' in meta:
+        entry['source'] = meta['source']
+    # Lettura e scrittura sotto lo stesso lock: le voci scritte da altri processi non si perdono
+    with _locked_catalog(path):
+        catalog = _read_catalog_file(path)
+        catalog[os.path.basename(filename)] = entry
+        _write_json(path, catalog)
+
+def _remove_catalog_entries(data_dir, names):
+    path = get_catalog_path(data_dir)
+    with _locked_catalog(path):
+        catalog = _read_catalog_file(path)
+        for name in names:
+            catalog.pop(name, None)
+        _write_json(path, catalog)
+
+def _read_catalog_file(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _data_files(data_dir):
+    """Names of the {symbol}_{timeframe}.csv files in data_dir"""
+    return {name for name in os.listdir(data_dir) if name.endswith('.csv') and parse_data_filename(name) is not None}
+
+def _register(filename):
+    meta = read_meta(filename) if is_store_valid(filename) else build_store(filename)
+    update_catalog(filename, meta)
+
+def rebuild_catalog(data_dir='csv'):
+    """Register every {symbol}_{timeframe}.csv of data_dir, building stale stores, and drop deleted files"""
+    names = _data_files(data_dir)
+    for name in sorted(names):
+        _register(os.path.join(data_dir, name))
+    gone = set(_read_catalog_file(get_catalog_path(data_dir))) - names
+    if gone:
+        _remove_catalog_entries(data_dir, gone)
+
+def get_catalog(data_dir='csv'):
+    """Catalog of the data files in data_dir, cached until catalog.json changes.
+
+    Files copied into or deleted from data_dir by hand are registered or
+    dropped on the next call.
+    """
+    if not os.path.isdir(data_dir):
+        return {}
+    path = get_catalog_path(data_dir)
+    names = _data_files(data_dir)
+    catalog = _cached_catalog(path)
+    if names != set(catalog):
+        for name in sorted(names - set(catalog)):
+            _register(os.path.join(data_dir, name))
+        if set(catalog) - names:
+            _remove_catalog_entries(data_dir, set(catalog) - names)
+        catalog = _cached_catalog(path)
+    return catalog
+
+def _cached_catalog(path):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    cached = _catalog_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, _read_catalog_file(path))
+        _catalog_cache[path] = cached
+    return cached[1]
+
+def get_file_info(filename):
+    """Catalog entry of a data file, refreshed only if the CSV changed"""
+    entry = get_catalog(os.path.dirname(filename)).get(os.path.basename(filename))
+    if entry is not None:
+        fp = csv_fingerprint(filename)
+        if entry['csv_size'] == fp['csv_size'] and entry['csv_mtime_ns'] == fp['csv_mtime_ns']:
+            return entry
+    meta = build_store(filename)
+    return get_catalog(os.path.dirname(filename)).get(os.path.basename(filename), meta)
+
+def get_date_limits(filename):
+    """(first, last) bar timestamps of a data file as pandas Timestamps"""
+    info = get_file_info(filename)
+    if info['first_ts'] is None:
+        return None, None
+    return pd.Timestamp(info['first_ts'], unit='ms'), pd.Timestamp(info['last_ts'], unit='ms')
+
+def list_available(data_dir='csv'):
+    """Sorted (pairs, timeframes) available in the catalog"""
+    catalog = get_catalog(data_dir)
+    pairs = sorted({entry['symbol'] for entry in catalog.values()})
+    timeframes = sorted({entry['timeframe'] for entry in catalog.values()})
+    return pairs, timeframes
@@ -0,0 +1,214 @@
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from kline_fetcher import update_kline_file, get_client, get_data_filename
+from resample import ensure_resampled, is_derived_file
+from data_store import read_meta
+
+# Peso delle richieste Binance (REQUEST_WEIGHT per minuto, /api/v3/klines = 2)
+WEIGHT_PER_MINUTE = 6000
+KLINES_WEIGHT = 2
+
+class TokenBucket:
+    """Thread-safe weight-based token bucket shared by all download jobs"""
+
+    def __init__(self, capacity, refill_rate):
+        self.capacity = capacity
+        self.refill_rate = refill_rate  # token al secondo
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_weight_limit(cls, weight_limit=WEIGHT_PER_MINUTE, window=60.0):
+        # capacity + window*rate == weight_limit: nessuna finestra supera il limite
+        return cls(capacity=weight_limit * 0.1, refill_rate=weight_limit * 0.9 / window)
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.refill_rate)
+        self.last = now
+
+    def acquire(self, weight=1):
+        """Block until `weight` tokens are available, then take them"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                wait = max(self.blocked_until - now, (weight - self.tokens) / self.refill_rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop every job for `seconds` and empty the bucket (e.g. after a 429)"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+class RateLimitedClient:
+    """Client wrapper that takes the request weight from a shared TokenBucket"""
+
+    def __init__(self, client, bucket, weight=KLINES_WEIGHT):
+        self.client = client
+        self.bucket = bucket
+        self.weight = weight
+
+    def _call(self, weight, method, **kwargs):
+        self.bucket.acquire(weight)
+        try:
+            return method(**kwargs)
+        except Exception as e:
+            if getattr(e, 'status_code', None) in (418, 429):
+                self.bucket.pause(getattr(e, 'retry_after', None) or 1.0)
+            raise
+
+    def get_klines(self, **kwargs):
+        return self._call(self.weight, self.client.get_klines, **kwargs)
+
+    def get_server_time(self):
+        # Usato da kline_fetcher.client_now_ms per l'orario del server (peso 1)
+        return self._call(1, self.client.get_server_time)
+
+    def __getattr__(self, name):
+        # Gli altri metodi passano direttamente al client, senza consumare peso
+        if name == 'client':
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+class DownloadJob:
+    """State and progress of a single (symbol, interval) download"""
+
+    def __init__(self, symbol, interval):
+        self.symbol = symbol
+        self.interval = interval
+        self.status = 'pending'
+        self.message = ''
+        self.rows = 0
+        self.error = None
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return f"DownloadJob({self.symbol} {self.interval} {self.status} rows={self.rows})"
+
+def download_all(symbols, intervals, client_factory=None, bucket=None, max_workers=8,
+                 progress_callback=None, days=None, resample_from=None):
+    """Update every (symbol, interval) CSV concurrently under a shared rate limit.
+
+    client_factory() builds one client per job (default: real Binance client).
+    progress_callback receives (job, message) for per-job updates; days
+    overrides the history length of new files. If resample_from (e.g. '1m')
+    is among the intervals, only that interval is downloaded and the others
+    are built locally from it (files downloaded earlier keep being
+    downloaded). Returns the list of DownloadJob with final
+    status 'done' or 'error'.
+    """
+    if client_factory is None:
+        client_factory = get_client
+    if bucket is None:
+        bucket = TokenBucket.for_weight_limit()
+    jobs = [DownloadJob(symbol, interval) for symbol in symbols for interval in intervals]
+    derived = []
+    if resample_from in intervals:
+        derived = [job for job in jobs if job.interval != resample_from
+                   and is_derived_file(get_data_filename(job.symbol, job.interval))]
+        jobs = [job for job in jobs if job not in derived]
+
+    def run_job(job):
+        def report(msg):
+            job.message = msg
+            if progress_callback:
+                progress_callback(job, msg)
+        job.status = 'running'
+        start = time.monotonic()
+        client = RateLimitedClient(client_factory(), bucket)
+        try:
+            job.rows = update_kline_file(job.symbol, job.interval, filename=get_data_filename(job.symbol, job.interval),
+                                         client=client, progress_callback=report, days=days)
+            job.status = 'done'
+            report(f"Done ({job.rows} new rows)")
+        except Exception as e:
+            job.status = 'error'
+            job.error = e
+            report(f"Error updating {job.symbol} {job.interval}: {e}")
+        job.elapsed = time.monotonic() - start
+        return job
+
+    def resample_job(job):
+        start = time.monotonic()
+        try:
+            filename = ensure_resampled(job.symbol, job.interval, resample_from)
+            job.rows = read_meta(filename)['rows']
+            job.status = 'done'
+            if progress_callback:
+                progress_callback(job, f"Built from {resample_from} data ({job.rows} rows)")
+        except Exception as e:
+            job.status = 'error'
+            job.error = e
+            if progress_callback:
+                progress_callback(job, f"Error resampling {job.symbol} {job.interval}: {e}")
+        job.elapsed = time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        for _ in as_completed(futures):
+            pass
+    base_ok = {job.symbol for job in jobs if job.status == 'done'}
+    for job in derived:
+        if job.symbol in base_ok:
+            resample_job(job)
+        else:
+            job.status = 'error'
+            job.error = Exception(f"{resample_from} download failed")
+            if progress_callback:
+                progress_callback(job, f"Skipped: {resample_from} download failed")
+    return jobs + derived
+
+def benchmark(num_pairs=50, intervals=('1m', '5m', '15m', '1h', '4h', '1d'), days=3,
+              workers=(1, 8, 32), latency=0.05, weight_limit=1200, window=6.0):
+    """Serial vs concurrent download against FakeKlineServer, in a temp directory"""
+    import os
+    import tempfile
+    from binance_stub import FakeKlineServer, StubClient
+    import kline_fetcher
+
+    end = kline_fetcher.now_ms()
+    symbols = [f"PAIR{i}USDT" for i in range(num_pairs)]
+    cwd = os.getcwd()
+    try:
+        for n in workers:
+            with tempfile.TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                server = FakeKlineServer(weight_limit=weight_limit, window=window, latency=latency)
+                bucket = TokenBucket.for_weight_limit(weight_limit, window)
+                start = time.monotonic()
+                jobs = download_all(symbols, intervals, client_factory=lambda: StubClient(now_ms=end, server=server),
+                                    bucket=bucket, max_workers=n, days=days)
+                elapsed = time.monotonic() - start
+                errors = sum(job.status == 'error' for job in jobs)
+                print(f"workers={n:3d}  jobs={len(jobs)}  requests={server.requests}  rejected={server.rejected}  "
+                      f"errors={errors}  time={elapsed:.2f}s  ({server.requests / elapsed:.1f} req/s)")
+                os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+
+def main():
+    parser = argparse.ArgumentParser(description="Download concorrente dei CSV di klines")
+    parser.add_argument('--symbols', type=str, nargs='+', default=['BTCUSDT'], help='Trading Pairs')
+    parser.add_argument('--timeframes', type=str, nargs='+', default=['1m', '5m', '15m', '1h', '4h', '1d'], help='Timeframes')
+    parser.add_argument('--workers', type=int, default=8, help='Download concorrenti')
+    parser.add_argument('--benchmark', action='store_true', help='Benchmark locale contro il server di klines simulato')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        return
+    jobs = download_all(args.symbols, args.timeframes, max_workers=args.workers,
+                        progress_callback=lambda job, msg: print(f"[{job.symbol} {job.interval}] {msg}"))
+    for job in jobs:
+        print(f"{job.symbol} {job.interval}: {job.status} ({job.rows} rows, {job.elapsed:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import numpy as np
+from fast_engine import (EXIT_TP, EXIT_SL, EXIT_TIME, COUNTER_NAMES, MIN_SIZE, make_sides,
+                         equity_from_steps, trading_calendar, summarize_metrics)
+from first_passage import FirstPassageIndex, _first_passage
+try:
+    from numba import jit
+    numba_available = True
+except ImportError:
+    numba_available = False
+
+def trade_drawdown(maxs, mins, offsets, nlevels, close, start, stop, cash, position, peak, max_dd):
+    """Peak and max drawdown after holding `position` on bars [start, stop).
+
+    Only the bars that set a new peak or a deeper drawdown change the
+    result; each one is found with a first-passage query on the closes
+    (thresholds are the prices where the value cash + position * close
+    crosses them), so bars in between are never visited. Returns the
+    updated (peak, max_dd).
+    """
+    j = start
+    while j < stop:
+        new_peak = (peak - cash) / position
+        new_low = (peak * (1 - max_dd) - cash) / position
+        if position > 0:
+            upper, lower = new_peak, new_low
+        else:
+            upper, lower = new_low, new_peak
+        # Margine contro gli arrotondamenti: un evento in più non cambia nulla, il valore è ricontrollato
+        upper -= 1e-12 * abs(upper)
+        lower += 1e-12 * abs(lower)
+        k = _first_passage(maxs, mins, offsets, nlevels, j, stop, upper, lower)
+        if k < 0:
+            break
+        value = cash + position * close[k]
+        if value > peak:
+            peak = value
+        elif (peak - value) / peak > max_dd:
+            max_dd = (peak - value) / peak
+        j = k + 1
+    return peak, max_dd
+
+def event_kernel(open_, close, sides, maxs, mins, offsets, nlevels, tp, sl, commission, initial_cash,
+                 size_pct, entry_period, max_hold):
+    """RandomEntryTPSL driven by events instead of bars.
+
+    From each entry the exit bar is resolved with one first-passage query
+    and the loop jumps there, then to the next allowed entry: bars where
+    nothing happens are never visited. The drawdown is tracked with
+    trade_drawdown, which visits only the bars of a trade that set a new
+    peak or a deeper drawdown; flat stretches keep the value of the last
+    fill. Returns the fill steps (bar, cash, position),
+    the trade pnl, the exit counters and the max drawdown in %.
+    """
+    n = len(close)
+    max_trades = n // max(entry_period, 2) + 1
+    step_bar = np.empty(2 * max_trades, dtype=np.int64)
+    step_cash = np.empty(2 * max_trades)
+    step_pos = np.empty(2 * max_trades)
+    pnlcomm = np.full(max_trades, np.nan)
+    counters = np.zeros(3, dtype=np.int64)
+    hold = max(max_hold, 1)
+    cash = initial_cash
+    peak = initial_cash
+    max_dd = 0.0
+    trades = 0
+    steps = 0
+    i = 0
+    while i < n - 1:
+        price = close[i]
+        size = cash * size_pct / price
+        if size < MIN_SIZE:
+            i += 1
+            continue
+        side = sides[i]
+        fill = i + 1
+        entry_price = open_[fill]
+        entry_comm = size * entry_price * commission
+        position = side * size
+        cash -= position * entry_price + entry_comm
+        step_bar[steps] = fill
+        step_cash[steps] = cash
+        step_pos[steps] = position
+        steps += 1
+        trades += 1
+
+        stop = min(fill + hold, n)
+        if side > 0:
+            tp_price = price * (1 + tp)
+            sl_price = price * (1 - sl)
+            signal = _first_passage(maxs, mins, offsets, nlevels, fill, stop, tp_price, sl_price)
+            reason = EXIT_TP if signal >= 0 and close[signal] >= tp_price else EXIT_SL
+        else:
+            tp_price = price * (1 - tp)
+            sl_price = price * (1 + sl)
+            signal = _first_passage(maxs, mins, offsets, nlevels, fill, stop, sl_price, tp_price)
+            reason = EXIT_TP if signal >= 0 and close[signal] <= tp_price else EXIT_SL
+        if signal < 0 and fill + hold <= n:
+            signal = fill + hold - 1
+            reason = EXIT_TIME
+
+        # Drawdown sulle barre in posizione (fino a quella prima dell'uscita)
+        last = n - 1 if signal < 0 or signal + 1 >= n else signal
+        peak, max_dd = trade_drawdown(maxs, mins, offsets, nlevels, close, fill, last + 1, cash, position,
+                                      peak, max_dd)
+        if signal < 0:
+            break
+        counters[reason] += 1
+        if signal + 1 >= n:
+            break
+
+        exit_bar = signal + 1
+        exit_price = open_[exit_bar]
+        exit_comm = size * exit_price * commission
+        cash += position * exit_price - exit_comm
+        pnlcomm[trades - 1] = position * (exit_price - entry_price) - entry_comm - exit_comm
+        step_bar[steps] = exit_bar
+        step_cash[steps] = cash
+        step_pos[steps] = 0.0
+        steps += 1
+        if cash > peak:
+            peak = cash
+        elif (peak - cash) / peak > max_dd:
+            max_dd = (peak - cash) / peak
+        i = max(exit_bar, i + entry_period)
+    return (step_bar[:steps], step_cash[:steps], step_pos[:steps], pnlcomm[:trades],
+            counters, max_dd * 100)
+
+if numba_available:
+    trade_drawdown = jit(nopython=True, cache=True)(trade_drawdown)
+    event_kernel = jit(nopython=True, cache=True)(event_kernel)
+
+def run_event_backtest(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold,
+                       trade_type='LONG', rng=None, index=None, calendar=None, sides=None):
+    """Event-driven backtest: work grows with trades, not with bars.
+
+    Pass `index` (FirstPassageIndex over the closes) and `calendar`
+    (trading_calendar of the timestamps) to reuse them across runs on the
+    same data; the analyzers only read the broker value at the calendar
+    bars.
+    """
+    close = np.ascontiguousarray(arrays['close'], dtype=np.float64)
+    open_ = np.ascontiguousarray(arrays['open'], dtype=np.float64)
+    if index is None:
+        index = FirstPassageIndex(close)
+    if calendar is None:
+        calendar = trading_calendar(arrays['timestamp'])
+    if sides is None:
+        sides = make_sides(trade_type, len(close), rng)
+    step_bar, step_cash, step_pos, pnlcomm, counters, max_drawdown = event_kernel(
+        open_, close, sides, index.maxs, index.mins, index.offsets, index.nlevels, tp, sl, commission,
+        initial_cash, size_pct, entry_period, max_hold)
+
+    def value_at(bars):
+        return equity_from_steps(close, step_bar, step_cash, step_pos, initial_cash, at=bars)
+
+    final_value = value_at([len(close) - 1])[0]
+    closed_pnl = pnlcomm[~np.isnan(pnlcomm)]
+    return summarize_metrics(calendar, value_at(calendar['day_starts']), value_at(calendar['year_ends']),
+                             final_value, float(max_drawdown), initial_cash, len(pnlcomm), closed_pnl,
+                             dict(zip(COUNTER_NAMES, counters)))
@@ -0,0 +1,322 @@
+import math
+import numpy as np
+from random_entry_strategy import calculate_exit_prices_py
+from first_passage import FirstPassageIndex
+try:
+    from numba import jit
+    numba_available = True
+except ImportError:
+    numba_available = False
+
+MS_PER_DAY = 86_400_000
+# Parametri degli analyzer usati da run_single_backtest (valori di default di backtrader)
+RISK_FREE_RATE = 0.01
+TRADING_DAYS = 252
+VWR_TAU = 0.20
+VWR_SDEV_MAX = 2.0
+MIN_SIZE = 0.001
+# Codici del motivo di uscita nei record dei trade del kernel (-1: trade ancora aperto)
+EXIT_TP, EXIT_SL, EXIT_TIME = 0, 1, 2
+COUNTER_NAMES = ('tp', 'sl', 'time')
+
+def first_hit(index, close, start, stop, tp_price, sl_price, side):
+    """First bar in [start, stop) where TP or SL triggers on the close: (bar, 'tp'|'sl') or (-1, None)"""
+    if side > 0:
+        bar = index.first_passage(start, stop, upper=tp_price, lower=sl_price)
+        return (bar, 'tp' if close[bar] >= tp_price else 'sl') if bar >= 0 else (-1, None)
+    bar = index.first_passage(start, stop, upper=sl_price, lower=tp_price)
+    return (bar, 'tp' if close[bar] <= tp_price else 'sl') if bar >= 0 else (-1, None)
+
+def simulate_trades(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold, trade_type,
+                    rng=None, index=None, sides=None):
+    """Replay RandomEntryTPSL on OHLCV arrays without Cerebro.
+
+    Same semantics as the strategy under backtrader: entries and exits are
+    decided on the close and filled at the next bar's open, TP/SL are
+    checked on the close against the signal close, exit counters are
+    incremented on the signal bar. Returns the trade list and the exit
+    counters; a trade with exit_bar -1 is still open at the end of the data.
+    Each exit is one O(log n) FirstPassageIndex query over the closes; pass
+    `index` to reuse one across runs on the same data. The side of a trade
+    signalled on bar i is sides[i] (see make_sides).
+    """
+    close = np.asarray(arrays['close'])
+    if index is None:
+        index = FirstPassageIndex(close)
+    open_ = np.asarray(arrays['open'])
+    n = len(close)
+    if sides is None:
+        sides = make_sides(trade_type, n, rng)
+    cash = initial_cash
+    trades = []
+    counters = {'tp': 0, 'sl': 0, 'time': 0}
+    hold = max(max_hold, 1)
+    i = 0
+    while i < n:
+        # Da flat il valore del portafoglio è la cassa: size = cash * size_pct / close
+        size = cash * size_pct / close[i]
+        if size < MIN_SIZE:
+            ok = np.flatnonzero(cash * size_pct / close[i:] >= MIN_SIZE)
+            if len(ok) == 0:
+                break
+            i += int(ok[0])
+            size = cash * size_pct / close[i]
+        side = int(sides[i])
+        fill = i + 1
+        if fill >= n:
+            break  # ordine mai eseguito
+        entry_price = open_[fill]
+        entry_comm = size * entry_price * commission
+        cash -= side * size * entry_price + entry_comm
+        trade = {'side': side, 'size': size, 'entry_bar': fill, 'entry_price': entry_price,
+                 'entry_cash': cash, 'exit_bar': -1, 'exit_price': np.nan, 'exit_cash': np.nan,
+                 'reason': None, 'pnlcomm': np.nan}
+        trades.append(trade)
+        tp_price, sl_price = calculate_exit_prices_py(close[i], tp, sl, 'long' if side > 0 else 'short')
+        stop = min(fill + hold, n)
+        signal, reason = first_hit(index, close, fill, stop, tp_price, sl_price, side)
+        if signal < 0:
+            if fill + hold > n:
+                break  # dati finiti prima di TP/SL/max_hold
+            signal, reason = fill + hold - 1, 'time'
+        counters[reason] += 1
+        trade['reason'] = reason
+        if signal + 1 >= n:
+            break  # chiusura segnalata sull'ultima barra, mai eseguita
+        exit_bar = signal + 1
+        exit_price = open_[exit_bar]
+        exit_comm = size * exit_price * commission
+        cash += side * size * exit_price - exit_comm
+        trade.update(exit_bar=exit_bar, exit_price=exit_price, exit_cash=cash,
+                     pnlcomm=side * size * (exit_price - entry_price) - entry_comm - exit_comm)
+        i = max(exit_bar, i + entry_period)
+    return trades, counters
+
+def equity_curve(arrays, trades, initial_cash):
+    """Broker value at every close, built from the cash/position steps of the trades"""
+    close = np.asarray(arrays['close'])
+    bars = []
+    cash_levels = []
+    pos_levels = []
+    for trade in trades:
+        bars.append(trade['entry_bar'])
+        cash_levels.append(trade['entry_cash'])
+        pos_levels.append(trade['side'] * trade['size'])
+        if trade['exit_bar'] >= 0:
+            bars.append(trade['exit_bar'])
+            cash_levels.append(trade['exit_cash'])
+            pos_levels.append(0.0)
+    return equity_from_steps(close, bars, cash_levels, pos_levels, initial_cash)
+
+def equity_from_steps(close, bars, cash_levels, pos_levels, initial_cash, at=None):
+    """Broker value at the closes of bars `at` (default: every bar).
+
+    cash_levels/pos_levels are the cash and position after each fill bar
+    in `bars` (increasing).
+    """
+    at = np.arange(len(close)) if at is None else np.asarray(at)
+    step = np.searchsorted(np.asarray(bars, dtype=np.int64), at, side='right')
+    cash = np.r_[initial_cash, cash_levels][step]
+    position = np.r_[0.0, pos_levels][step]
+    return cash + position * np.asarray(close)[at]
+
+def period_ends(period):
+    """Index of the last bar of every run of equal values in period"""
+    return np.flatnonzero(np.r_[period[1:] != period[:-1], True])
+
+def trading_calendar(timestamps):
+    """Bars sampled by the analyzers: first bar of each day and last bar of each year"""
+    timestamps = np.asarray(timestamps)
+    days = timestamps // MS_PER_DAY
+    years = timestamps.astype('datetime64[ms]').astype('datetime64[Y]')
+    return {
+        'bars': len(timestamps),
+        'day_starts': np.flatnonzero(np.r_[True, days[1:] != days[:-1]]),
+        'year_ends': period_ends(years),
+    }
+
+def compute_metrics(timestamps, value, initial_cash, total_trades, closed_pnl, counters, calendar=None):
+    """Result dict with the same keys and formulas as the backtrader analyzers"""
+    if calendar is None:
+        calendar = trading_calendar(timestamps)
+    peak = np.maximum.accumulate(value)
+    max_drawdown = float(((peak - value) / peak).max() * 100)
+    return summarize_metrics(calendar, value[calendar['day_starts']], value[calendar['year_ends']], value[-1],
+                             max_drawdown, initial_cash, total_trades, closed_pnl, counters)
+
+def summarize_metrics(calendar, day_values, year_values, final_value, max_drawdown, initial_cash,
+                      total_trades, closed_pnl, counters):
+    """Result dict from the broker value at the calendar bars only (see trading_calendar)"""
+    day_starts = calendar['day_starts']
+    # Returns: un periodo per ogni giorno di calendario con almeno una barra
+    rtot = math.log(final_value / initial_cash)
+    ravg = rtot / len(day_starts)
+    annual_return = math.expm1(ravg * TRADING_DAYS) * 100
+
+    # VWR: il valore al primo bar di ogni giorno chiude il periodo precedente
+    pis = np.r_[initial_cash, day_values]
+    pns = np.r_[day_values, final_value]
+    if day_starts[-1] == calendar['bars'] - 1:
+        pis, pns = pis[:-1], pns[:-1]
+    periods = np.arange(1, len(pis) + 1)
+    dts = pns / (pis * np.exp(ravg * periods)) - 1.0
+    sdev = float(np.std(dts, ddof=1)) if len(dts) > 1 else 0.0
+    vwr = annual_return * (1.0 - pow(sdev / VWR_SDEV_MAX, VWR_TAU))
+
+    # SharpeRatio: rendimenti annuali (TimeReturn), deviazione standard senza bessel
+    year_returns = year_values / np.r_[initial_cash, year_values[:-1]] - 1.0
+    excess = year_returns - RISK_FREE_RATE
+    retdev = float(np.std(excess))
+    sharpe = float(excess.mean()) / retdev if retdev > 0 else None
+
+    won = int(np.count_nonzero(closed_pnl >= 0.0))
+    return {
+        'pnl': (final_value - initial_cash) / initial_cash * 100,
+        'sharpe': sharpe,
+        'annual_return': annual_return,
+        'max_drawdown': max_drawdown,
+        'total_trades': total_trades,
+        'won_trades': won,
+        'lost_trades': len(closed_pnl) - won,
+        'win_rate': won / total_trades * 100 if total_trades > 0 else 0,
+        'avg_trade': float(np.mean(closed_pnl)) if len(closed_pnl) else 0,
+        'vwr': vwr,
+        'exit_tp': int(counters['tp']),
+        'exit_sl': int(counters['sl']),
+        'exit_time': int(counters['time']),
+    }
+
+def run_fast_backtest(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold,
+                      trade_type='LONG', rng=None, index=None, sides=None):
+    """RandomEntryTPSL backtest on OHLCV arrays, without Cerebro"""
+    trades, counters = simulate_trades(arrays, tp, sl, commission, initial_cash, size_pct,
+                                       entry_period, max_hold, trade_type, rng, index, sides)
+    value = equity_curve(arrays, trades, initial_cash)
+    closed_pnl = np.array([t['pnlcomm'] for t in trades if t['exit_bar'] >= 0])
+    return compute_metrics(np.asarray(arrays['timestamp']), value, initial_cash, len(trades), closed_pnl, counters)
+
+def make_sides(trade_type, n, rng=None):
+    """Side (+1 long, -1 short) used if an entry is signalled at each bar.
+
+    The side depends on the bar, not on how many trades came before, so the
+    array drawn once from a seed can be shared by every cell of a sweep (and
+    rebuilt identically in each worker): all cells see the same coin flips
+    and their differences are not swamped by sampling noise (common random
+    numbers). rng is a seed, SeedSequence or Generator.
+    """
+    ttype = trade_type.upper()
+    if ttype == 'BOTH':
+        return np.random.default_rng(rng).choice(np.array([1, -1], dtype=np.int8), n)
+    return np.full(n, -1 if ttype == 'SHORT' else 1, dtype=np.int8)
+
+def random_entry_kernel(open_, close, sides, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold):
+    """Whole RandomEntryTPSL loop over the bars, as one compiled function.
+
+    Orders signalled on a close are filled at the next open, exactly like
+    the strategy under backtrader. Returns the trade records (entry/exit
+    bar, side, size, entry/exit price, net pnl, exit reason), the
+    tp/sl/time exit counters and the broker value at every close.
+    """
+    n = len(close)
+    max_trades = n // max(entry_period, 2) + 1
+    entry_bar = np.full(max_trades, -1, dtype=np.int64)
+    exit_bar = np.full(max_trades, -1, dtype=np.int64)
+    side = np.zeros(max_trades, dtype=np.int8)
+    size = np.zeros(max_trades)
+    entry_price = np.zeros(max_trades)
+    exit_price = np.full(max_trades, np.nan)
+    pnlcomm = np.full(max_trades, np.nan)
+    reason = np.full(max_trades, -1, dtype=np.int8)
+    counters = np.zeros(3, dtype=np.int64)
+    value = np.empty(n)
+
+    cash = initial_cash
+    position = 0.0
+    entry_comm = 0.0
+    trades = 0
+    next_entry = 0
+    pending_entry = False
+    pending_exit = False
+    bar_in_trade = 0
+    tp_price = 0.0
+    sl_price = 0.0
+    for k in range(n):
+        # Ordini eseguiti all'apertura della barra
+        if pending_entry:
+            t = trades - 1
+            entry_bar[t] = k
+            entry_price[t] = open_[k]
+            entry_comm = size[t] * open_[k] * commission
+            position = side[t] * size[t]
+            cash -= position * open_[k] + entry_comm
+            pending_entry = False
+        elif pending_exit:
+            t = trades - 1
+            exit_comm = size[t] * open_[k] * commission
+            cash += position * open_[k] - exit_comm
+            exit_bar[t] = k
+            exit_price[t] = open_[k]
+            pnlcomm[t] = position * (open_[k] - entry_price[t]) - entry_comm - exit_comm
+            position = 0.0
+            pending_exit = False
+
+        price = close[k]
+        if position == 0.0:
+            if k >= next_entry:
+                trade_size = cash * size_pct / price
+                if trade_size >= MIN_SIZE:
+                    side[trades] = sides[k]
+                    size[trades] = trade_size
+                    trades += 1
+                    if sides[k] > 0:
+                        tp_price = price * (1 + tp)
+                        sl_price = price * (1 - sl)
+                    else:
+                        tp_price = price * (1 - tp)
+                        sl_price = price * (1 + sl)
+                    next_entry = k + entry_period
+                    bar_in_trade = 0
+                    pending_entry = True
+        else:
+            bar_in_trade += 1
+            if position > 0:
+                tp_hit = price >= tp_price
+                sl_hit = price <= sl_price
+            else:
+                tp_hit = price <= tp_price
+                sl_hit = price >= sl_price
+            exit_reason = -1
+            if tp_hit:
+                exit_reason = EXIT_TP
+            elif sl_hit:
+                exit_reason = EXIT_SL
+            elif bar_in_trade >= max_hold:
+                exit_reason = EXIT_TIME
+            if exit_reason >= 0:
+                counters[exit_reason] += 1
+                reason[trades - 1] = exit_reason
+                pending_exit = True
+        value[k] = cash + position * price
+
+    # Un ingresso segnalato sull'ultima barra non viene mai eseguito
+    if pending_entry:
+        trades -= 1
+    return (entry_bar[:trades], exit_bar[:trades], side[:trades], size[:trades], entry_price[:trades],
+            exit_price[:trades], pnlcomm[:trades], reason[:trades], counters, value)
+
+if numba_available:
+    random_entry_kernel = jit(nopython=True, cache=True)(random_entry_kernel)
+
+def run_numba_backtest(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold,
+                       trade_type='LONG', rng=None, sides=None):
+    """RandomEntryTPSL backtest with the compiled kernel (plain Python if Numba is missing)"""
+    close = np.ascontiguousarray(arrays['close'], dtype=np.float64)
+    open_ = np.ascontiguousarray(arrays['open'], dtype=np.float64)
+    if sides is None:
+        sides = make_sides(trade_type, len(close), rng)
+    (entry_bar, exit_bar, side, size, entry_price, exit_price,
+     pnlcomm, reason, counters, value) = random_entry_kernel(open_, close, sides, tp, sl, commission, initial_cash,
+                                                             size_pct, entry_period, max_hold)
+    counters = dict(zip(COUNTER_NAMES, counters))
+    return compute_metrics(np.asarray(arrays['timestamp']), value, initial_cash, len(entry_bar),
+                           pnlcomm[exit_bar >= 0], counters)
@@ -0,0 +1,82 @@
+import numpy as np
+try:
+    from numba import jit
+    numba_available = True
+except ImportError:
+    numba_available = False
+
+def _first_passage(maxs, mins, offsets, nlevels, start, stop, upper, lower):
+    # Livello k: massimo/minimo dei blocchi allineati di 2**k barre
+    j = start
+    level = 0
+    while j < stop:
+        p = j >> level
+        end = (p + 1) << level
+        if end > stop:
+            # Il blocco esce dall'intervallo: si scende fino a blocchi interi
+            level -= 1
+            continue
+        node = offsets[level] + p
+        if maxs[node] >= upper or mins[node] <= lower:
+            if level == 0:
+                return j
+            level -= 1
+            continue
+        j = end
+        # Blocco senza passaggio: si sale finché j è allineato a un blocco padre interno a [j, stop)
+        while (level + 1 < nlevels and ((j >> level) & 1) == 0
+               and (((j >> (level + 1)) + 1) << (level + 1)) <= stop):
+            level += 1
+    return -1
+
+def _first_passages(maxs, mins, offsets, nlevels, starts, stops, uppers, lowers):
+    out = np.empty(len(starts), dtype=np.int64)
+    for q in range(len(starts)):
+        out[q] = _first_passage(maxs, mins, offsets, nlevels, starts[q], stops[q], uppers[q], lowers[q])
+    return out
+
+if numba_available:
+    _first_passage = jit(nopython=True, cache=True)(_first_passage)
+    _first_passages = jit(nopython=True, cache=True)(_first_passages)
+
+class FirstPassageIndex:
+    """Block max/min hierarchy answering first-passage queries in O(log n).
+
+    ``first_passage(start, stop, upper, lower)`` returns the first bar j in
+    [start, stop) with high[j] >= upper or low[j] <= lower, or -1. Pass the
+    close for both series to reproduce the close-based TP/SL checks of
+    RandomEntryTPSL, or high/low for intrabar checks like the C++ Strategy.
+    Building costs O(n) time and 2n extra values per series.
+    """
+
+    def __init__(self, high, low=None):
+        high = np.ascontiguousarray(high, dtype=np.float64)
+        low = high if low is None else np.ascontiguousarray(low, dtype=np.float64)
+        self.n = len(high)
+        maxs, mins = [high], [low]
+        while len(maxs[-1]) > 1:
+            prev_max, prev_min = maxs[-1], mins[-1]
+            if len(prev_max) % 2:
+                prev_max = np.r_[prev_max, prev_max[-1]]
+                prev_min = np.r_[prev_min, prev_min[-1]]
+            maxs.append(np.maximum(prev_max[0::2], prev_max[1::2]))
+            mins.append(np.minimum(prev_min[0::2], prev_min[1::2]))
+        self.nlevels = len(maxs)
+        self.offsets = np.cumsum([0] + [len(level) for level in maxs[:-1]]).astype(np.int64)
+        self.maxs = np.concatenate(maxs)
+        self.mins = np.concatenate(mins)
+
+    def first_passage(self, start, stop=None, upper=np.inf, lower=-np.inf):
+        """First bar in [start, stop) reaching upper or lower, -1 if none"""
+        stop = self.n if stop is None else min(stop, self.n)
+        return int(_first_passage(self.maxs, self.mins, self.offsets, self.nlevels,
+                                  int(start), int(stop), float(upper), float(lower)))
+
+    def first_passages(self, starts, stops=None, uppers=np.inf, lowers=-np.inf):
+        """Vectorized first_passage over arrays of queries (scalars are broadcast)"""
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.full(len(starts), self.n) if stops is None else np.asarray(stops)
+        starts, stops, uppers, lowers = np.broadcast_arrays(starts, np.minimum(stops, self.n), uppers, lowers)
+        return _first_passages(self.maxs, self.mins, self.offsets, self.nlevels,
+                               np.ascontiguousarray(starts, dtype=np.int64), np.ascontiguousarray(stops, dtype=np.int64),
+                               np.ascontiguousarray(uppers, dtype=np.float64), np.ascontiguousarray(lowers, dtype=np.float64))
@@ -0,0 +1,173 @@
+import argparse
+import numpy as np
+import pandas as pd
+from data_store import load_arrays
+from fast_engine import MIN_SIZE, make_sides
+from kline_fetcher import get_data_filename
+
+def threshold_hits(running, thresholds):
+    """First index where a non-decreasing running extreme reaches each threshold.
+
+    One searchsorted resolves every threshold of the grid; len(running)
+    means never reached inside the window.
+    """
+    return np.searchsorted(running, thresholds, side='left')
+
+def evaluate_grid(arrays, tp_values, sl_values, commission=0.0005, initial_cash=100000, size_pct=0.1,
+                  entry_period=10, max_hold=3000, trade_type='LONG', rng=None, sides=None):
+    """Evaluate every (tp, sl) pair of the grid in a single pass over the trades.
+
+    Each combo has its own cash and next entry bar, max(exit fill,
+    signal + entry_period) as in RandomEntryTPSL, so it never holds more
+    than one trade and every cell equals a separate backtest. Combos that
+    signal on the same bar share the scan of the trade window: the running
+    max/min of the closes give the hit bar of all their TP and SL levels at
+    the same time. With entry_period > max_hold the combos stay in step
+    (one scan per signal for the whole grid); shorter periods let them
+    drift apart, down to one scan per trade of each combo. All combos
+    share the same long/short sides (common random numbers). Returns a dict of (len(tp_values), len(sl_values))
+    matrices.
+    """
+    close = np.asarray(arrays['close'], dtype=np.float64)
+    open_ = np.asarray(arrays['open'], dtype=np.float64)
+    n = len(close)
+    tp_values = np.asarray(tp_values, dtype=np.float64)
+    sl_values = np.asarray(sl_values, dtype=np.float64)
+    shape = (len(tp_values), len(sl_values))
+    # Soglie ordinate per searchsorted, riportate poi all'ordine della griglia
+    tp_order = np.argsort(tp_values)
+    sl_order = np.argsort(sl_values)
+    tp_rank = np.argsort(tp_order)
+    sl_rank = np.argsort(sl_order)
+    if sides is None:
+        sides = make_sides(trade_type, n, rng)
+    hold = max(max_hold, 1)
+    period = max(entry_period, 1)
+
+    # Una cella per combo, in forma piatta: indice del TP e dello SL di ciascuna
+    tp_cell, sl_cell = (index.ravel() for index in np.indices(shape))
+    cells = tp_cell.size
+    cash = np.full(cells, float(initial_cash))
+    unrealized = np.zeros(cells)
+    trades = np.zeros(cells, dtype=np.int64)
+    won = np.zeros(cells, dtype=np.int64)
+    closed = np.zeros(cells, dtype=np.int64)
+    closed_pnl = np.zeros(cells)
+    exit_tp = np.zeros(cells, dtype=np.int64)
+    exit_sl = np.zeros(cells, dtype=np.int64)
+    exit_time = np.zeros(cells, dtype=np.int64)
+    # Barra del prossimo segnale di ogni cella; n = cella ferma (trade aperto a fine dati o cassa finita)
+    next_entry = np.zeros(cells, dtype=np.int64)
+
+    while True:
+        signal = int(next_entry.min())
+        if signal >= n - 1:
+            break  # un ingresso sull'ultima barra non viene mai eseguito
+        group = np.flatnonzero(next_entry == signal)
+        entry_close = close[signal]
+        size = cash[group] * size_pct / entry_close
+        small = size < MIN_SIZE
+        if small.any():
+            # Da flat la cassa non cambia: la cella riprova alla prima chiusura abbastanza bassa
+            for cell in group[small]:
+                ok = np.flatnonzero(close[signal + 1:] <= cash[cell] * size_pct / MIN_SIZE)
+                next_entry[cell] = signal + 1 + ok[0] if len(ok) else n
+            group, size = group[~small], size[~small]
+            if not len(group):
+                continue
+
+        fill = signal + 1
+        window = close[fill:min(fill + hold, n)]
+        length = len(window)
+        side = sides[signal]
+        high = np.maximum.accumulate(window)
+        # -min corrente: non decrescente, confrontabile con searchsorted
+        neg_low = -np.minimum.accumulate(window)
+        if side > 0:
+            tp_hit = threshold_hits(high, entry_close * (1 + tp_values[tp_order]))[tp_rank]
+            sl_hit = threshold_hits(neg_low, -(entry_close * (1 - sl_values[sl_order])))[sl_rank]
+        else:
+            tp_hit = threshold_hits(neg_low, -(entry_close * (1 - tp_values[tp_order])))[tp_rank]
+            sl_hit = threshold_hits(high, entry_close * (1 + sl_values[sl_order]))[sl_rank]
+        tp_hit, sl_hit = tp_hit[tp_cell[group]], sl_hit[sl_cell[group]]
+
+        entry_price = open_[fill]
+        entry_comm = size * entry_price * commission
+        # Il TP ha la precedenza sullo SL nella stessa barra
+        by_tp = (tp_hit <= sl_hit) & (tp_hit < length)
+        by_sl = (sl_hit < tp_hit) & (sl_hit < length)
+        by_time = ~(by_tp | by_sl) & (length == hold)
+        exit_signal = np.where(by_tp, tp_hit, sl_hit)
+        exit_signal = np.where(by_time, hold - 1, exit_signal)
+        exit_bar = fill + exit_signal + 1
+        done = (by_tp | by_sl | by_time) & (exit_bar < n)
+        exit_price = open_[np.minimum(exit_bar, n - 1)]
+        pnl = side * size * (exit_price - entry_price) - entry_comm - size * exit_price * commission
+        # Trade ancora aperti a fine dati: valutati all'ultima chiusura come fa il broker
+        unrealized[group] = np.where(done, 0.0, side * size * (close[-1] - entry_price) - entry_comm)
+
+        # Il PnL entra in cassa all'uscita, prima del prossimo ingresso della cella
+        cash[group] += np.where(done, pnl, 0.0)
+        next_entry[group] = np.where(done, np.maximum(exit_bar, signal + period), n)
+        trades[group] += 1
+        closed[group] += done
+        won[group] += done & (pnl >= 0.0)
+        closed_pnl[group] += np.where(done, pnl, 0.0)
+        exit_tp[group] += by_tp
+        exit_sl[group] += by_sl
+        exit_time[group] += by_time
+
+    final_value = (cash + unrealized).reshape(shape)
+    trades, won, closed, closed_pnl = (values.reshape(shape) for values in (trades, won, closed, closed_pnl))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        win_rate = np.where(trades > 0, won / trades * 100, 0.0)
+        avg_trade = np.where(closed > 0, closed_pnl / closed, 0.0)
+    return {
+        'tp': tp_values,
+        'sl': sl_values,
+        'pnl': (final_value - initial_cash) / initial_cash * 100,
+        'win_rate': win_rate,
+        'total_trades': trades,
+        'won_trades': won,
+        'lost_trades': closed - won,
+        'avg_trade': avg_trade,
+        'exit_tp': exit_tp.reshape(shape),
+        'exit_sl': exit_sl.reshape(shape),
+        'exit_time': exit_time.reshape(shape),
+    }
+
+def grid_to_frame(grid, key='pnl'):
+    """Matrix `key` of an evaluate_grid result as a DataFrame (rows TP, columns SL)"""
+    return pd.DataFrame(grid[key], index=pd.Index(grid['tp'], name='tp'), columns=pd.Index(grid['sl'], name='sl'))
+
+def main():
+    parser = argparse.ArgumentParser(description="Griglia TP/SL valutata in un solo passaggio sui dati")
+    parser.add_argument('--symbol', type=str, default='BTCUSDT', help='Trading Pair')
+    parser.add_argument('--timeframe', type=str, default='1m', help='Timeframe')
+    parser.add_argument('--tp', type=float, nargs=3, default=[0.001, 0.10, 5], metavar=('MIN', 'MAX', 'N'),
+                        help='Take Profit: minimo, massimo, numero di punti')
+    parser.add_argument('--sl', type=float, nargs=3, default=[0.001, 0.10, 5], metavar=('MIN', 'MAX', 'N'),
+                        help='Stop Loss: minimo, massimo, numero di punti')
+    parser.add_argument('--commission', type=float, default=0.0005, help='Commission (%)')
+    parser.add_argument('--initial_cash', type=float, default=100000, help='Initial Cash')
+    parser.add_argument('--size_pct', type=float, default=0.1, help='Position Size (%)')
+    parser.add_argument('--entry_period', type=int, default=10, help='Entry Period (bars)')
+    parser.add_argument('--max_hold', type=int, default=3000, help='Max Hold (bars)')
+    parser.add_argument('--trade_type', type=str, default='LONG', choices=['LONG', 'SHORT', 'BOTH'], help='Trade Type')
+    parser.add_argument('--output', type=str, default='random_entry_grid_results.csv', help='CSV della matrice PnL')
+    args = parser.parse_args()
+
+    tp_values = np.linspace(args.tp[0], args.tp[1], int(args.tp[2]))
+    sl_values = np.linspace(args.sl[0], args.sl[1], int(args.sl[2]))
+    arrays = load_arrays(get_data_filename(args.symbol, args.timeframe))
+    grid = evaluate_grid(arrays, tp_values, sl_values, args.commission, args.initial_cash, args.size_pct,
+                         args.entry_period, args.max_hold, args.trade_type)
+    pnl = grid_to_frame(grid, 'pnl')
+    print("PnL (%):")
+    print(pnl.round(2))
+    print("\nWin rate (%):")
+    print(grid_to_frame(grid, 'win_rate').round(2))
+    pnl.to_csv(args.output)
+
+if __name__ == '__main__':
+    main()
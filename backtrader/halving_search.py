@@ -0,0 +1,116 @@
+import math
+import numpy as np
+import pandas as pd
+from sweep_store import cell_key, result_cell_key
+
+def rung_starts(first, last, rungs=3, eta=3):
+    """Start dates (YYYY-MM-DD) of the history slices of each rung, all ending at `last`.
+
+    Rung r covers the last 1/eta**(rungs-1-r) of [first, last], so every
+    rung sees eta times more history than the previous one and the last
+    rung the whole period.
+    """
+    first, last = pd.Timestamp(first).normalize(), pd.Timestamp(last).normalize()
+    span = (last - first).days + 1
+    starts = []
+    for r in range(rungs):
+        days = max(1, int(round(span / eta ** (rungs - 1 - r))))
+        starts.append(max(first, last - pd.Timedelta(days=days - 1)).strftime('%Y-%m-%d'))
+    starts[-1] = first.strftime('%Y-%m-%d')
+    return starts
+
+def rank(table, rank_by='pnl'):
+    """Best first; max_drawdown is minimized, every other metric maximized"""
+    return table.sort_values(rank_by, ascending=rank_by == 'max_drawdown', na_position='last').reset_index(drop=True)
+
+def successive_halving(evaluate, candidates, starts, end=None, eta=3, rank_by='pnl'):
+    """Successive halving of backtest_args candidates over growing history slices.
+
+    evaluate(args_list, start, end) returns the result table of the
+    candidates on that date range (one row per candidate with tp, sl,
+    max_hold, entry_period and the metrics). Each rung keeps the best
+    1/eta of the candidates for the next, longer slice; the last slice
+    should be the whole history. Returns the tables of every rung, the
+    last one ranked on the full history.
+    """
+    by_key = {cell_key(args): args for args in candidates}
+    survivors = list(by_key.values())
+    tables = []
+    for r, start in enumerate(starts):
+        table = rank(evaluate(survivors, start, end), rank_by)
+        table.insert(0, 'rung', r)
+        table.insert(1, 'start', start)
+        tables.append(table)
+        if r == len(starts) - 1:
+            break
+        keep = max(1, math.ceil(len(survivors) / eta))
+        survivors = [by_key[result_cell_key(row)] for _, row in table.head(keep).iterrows()]
+    return tables
+
+def neighbours(args, step, bounds=None):
+    """Cells moving one of tp, sl and max_hold at a time by a factor (1 - step) or (1 + step).
+
+    bounds is ((tp_min, tp_max), (sl_min, sl_max), (max_hold_min, max_hold_max));
+    moved values are clipped into it and moves the clip brings back onto
+    args are dropped, so at most 6 cells are returned.
+    """
+    cells = []
+    for axis, position in enumerate((0, 1, 8)):
+        for factor in (1 - step, 1 + step):
+            value = args[position] * factor
+            if position == 8:
+                value = max(1, int(round(value)))
+            if bounds is not None:
+                low, high = bounds[axis]
+                if position == 8:
+                    low, high = math.ceil(low), math.floor(high)
+                value = min(max(value, low), high)
+            if value == args[position]:
+                continue
+            cell = list(args)
+            cell[position] = value
+            cells.append(tuple(cell))
+    return cells
+
+def refine(evaluate, best, best_value=None, start=None, end=None, step=0.5, rounds=2, rank_by='pnl', seen=(),
+           bounds=None):
+    """Local refinement: evaluate the neighbours of the best cell, move there if better, halve the step.
+
+    `best` is a backtest_args tuple scoring `best_value`; cells in `seen`
+    (keys) are not run again and neighbours stay inside `bounds` (see
+    neighbours), so each round costs at most 6 backtests. Returns the
+    table of every evaluated neighbour.
+    """
+    seen = set(seen)
+    tables = []
+    for _ in range(rounds):
+        cells = [cell for cell in neighbours(best, step, bounds) if cell_key(cell) not in seen]
+        seen.update(cell_key(cell) for cell in cells)
+        if cells:
+            table = rank(evaluate(cells, start, end), rank_by)
+            tables.append(table)
+            top = table.iloc[0]
+            value = top[rank_by]
+            better = (best_value is None or pd.isna(best_value)
+                      or (value < best_value if rank_by == 'max_drawdown' else value > best_value))
+            if not pd.isna(value) and better:
+                by_key = {cell_key(cell): cell for cell in cells}
+                best, best_value = by_key[result_cell_key(top)], value
+        step /= 2
+    return tables
+
+def sample_candidates(backtest_args, tp_range, sl_range, max_hold_range, samples, rng=None):
+    """`samples` random (tp, sl, max_hold) cells, log-uniform inside the MIN MAX ranges"""
+    rng = np.random.default_rng(rng)
+
+    def draw(low, high):
+        return np.exp(rng.uniform(np.log(low), np.log(high), samples))
+
+    tps, sls = draw(*tp_range), draw(*sl_range)
+    holds = np.rint(draw(*max_hold_range)).astype(int)
+    cells = []
+    for tp, sl, hold in zip(tps, sls, holds):
+        cell = list(backtest_args)
+        cell[0], cell[1], cell[8] = float(tp), float(sl), int(hold)
+        cells.append(tuple(cell))
+    return cells
@@ -0,0 +1,250 @@
+import argparse
+import numpy as np
+from data_store import load_arrays
+from first_passage import FirstPassageIndex, _first_passage
+from kline_fetcher import get_data_filename
+try:
+    from numba import jit
+    numba_available = True
+except ImportError:
+    numba_available = False
+
+# Colonne di stampa_riga (src/printer.cpp), nello stesso ordine
+ROW_FIELDS = ('tp', 'sl', 'direzione', 'percent_success', 'ricavi', 'capitale', 'perdite', 'fee_totali',
+              'roi', 'non_chiusi', 'percent_no_tp_sl')
+LONG, SHORT = 0, 1
+SEPARATOR = ("+-------------+-------------+------------+---------------+----------------+----------------+"
+             "----------------+----------------+-------------+------------+------------+")
+
+def _resolve_long(high, low, k, tp_price, sl_price):
+    # Ordine dei controlli di check_exit_conditions: prima il TP, poi lo SL
+    if high[k] >= tp_price:
+        return 1
+    if low[k] <= sl_price:
+        return -1
+    return 0
+
+def _resolve_short(high, low, k, tp_price, sl_price):
+    if low[k] <= tp_price:
+        return 1
+    if high[k] >= sl_price:
+        return -1
+    return 0
+
+def _book(ricavi, perdite, fee_totali, successi, fallimenti, capitale, p, leg, amount, fee_val, profit):
+    # handle_trade_result / handle_timeout_exit
+    fee_totali[p, leg] += fee_val
+    if profit:
+        ricavi[p, leg] += amount
+        successi[p, leg] += 1
+        capitale[p, leg] += amount - fee_val
+    else:
+        perdite[p, leg] += amount
+        fallimenti[p, leg] += 1
+        capitale[p, leg] -= amount + fee_val
+
+def hedge_kernel(high, low, open_, close, maxs, mins, offsets, nlevels, tp_list, sl_list, finestra,
+                 capitale_per_trade, fee, periodo, exit_mode_close, capitale_iniziale):
+    """LONG and SHORT legs of every (tp, sl) pair opened together at each entry.
+
+    Both legs share one first-passage scan of the window over the union of
+    their bands (upper = min(long TP, short SL), lower = max(long SL,
+    short TP)); only a leg still open at that bar needs a second query from
+    there. Each leg keeps its own capital and stops like simulate_strategy
+    once it is exhausted. Arrays are indexed [pair, leg].
+    """
+    npairs = len(tp_list) * len(sl_list)
+    ricavi = np.zeros((npairs, 2))
+    perdite = np.zeros((npairs, 2))
+    fee_totali = np.zeros((npairs, 2))
+    successi = np.zeros((npairs, 2), dtype=np.int64)
+    fallimenti = np.zeros((npairs, 2), dtype=np.int64)
+    non_chiusi = np.zeros((npairs, 2), dtype=np.int64)
+    capitale = np.full((npairs, 2), capitale_iniziale)
+    alive = np.ones((npairs, 2), dtype=np.bool_)
+    fee_val = capitale_per_trade * fee
+    n = len(close)
+
+    for i in range(0, max(n - finestra, 0), periodo):
+        start = i + 1
+        stop = i + finestra + 1
+        price = open_[i]
+        for a in range(len(tp_list)):
+            tp = tp_list[a]
+            for b in range(len(sl_list)):
+                sl = sl_list[b]
+                p = a * len(sl_list) + b
+                for leg in range(2):
+                    if alive[p, leg] and capitale[p, leg] <= capitale_per_trade + 1:
+                        alive[p, leg] = False
+                if not alive[p, LONG] and not alive[p, SHORT]:
+                    continue
+                long_tp = price * (1.0 + tp / 100.0)
+                long_sl = price * (1.0 - sl / 100.0)
+                short_tp = price * (1.0 - tp / 100.0)
+                short_sl = price * (1.0 + sl / 100.0)
+                # Scansione condivisa: la prima barra che tocca una delle quattro soglie
+                upper = np.inf
+                lower = -np.inf
+                if alive[p, LONG]:
+                    upper = min(upper, long_tp)
+                    lower = max(lower, long_sl)
+                if alive[p, SHORT]:
+                    upper = min(upper, short_sl)
+                    lower = max(lower, short_tp)
+                k = _first_passage(maxs, mins, offsets, nlevels, start, stop, upper, lower)
+                for leg in range(2):
+                    if not alive[p, leg]:
+                        continue
+                    kk = k
+                    outcome = 0
+                    while kk >= 0:
+                        if leg == LONG:
+                            outcome = _resolve_long(high, low, kk, long_tp, long_sl)
+                        else:
+                            outcome = _resolve_short(high, low, kk, short_tp, short_sl)
+                        if outcome != 0:
+                            break
+                        # Barra dell'altra gamba: si prosegue con le sole soglie di questa
+                        if leg == LONG:
+                            kk = _first_passage(maxs, mins, offsets, nlevels, kk + 1, stop, long_tp, long_sl)
+                        else:
+                            kk = _first_passage(maxs, mins, offsets, nlevels, kk + 1, stop, short_sl, short_tp)
+                    if outcome != 0:
+                        pct = tp if outcome > 0 else sl
+                        _book(ricavi, perdite, fee_totali, successi, fallimenti, capitale, p, leg,
+                              capitale_per_trade * pct / 100.0, fee_val, outcome > 0)
+                        continue
+                    non_chiusi[p, leg] += 1
+                    if exit_mode_close:
+                        exit_close = close[i + finestra]
+                        if leg == LONG:
+                            variazione = (exit_close - price) / price
+                        else:
+                            variazione = (price - exit_close) / price
+                        if variazione > 0:
+                            amount = capitale_per_trade * variazione
+                        else:
+                            amount = capitale_per_trade * (-variazione)
+                        _book(ricavi, perdite, fee_totali, successi, fallimenti, capitale, p, leg,
+                              amount, fee_val, variazione > 0)
+    return ricavi, perdite, fee_totali, successi, fallimenti, non_chiusi, capitale
+
+if numba_available:
+    _resolve_long = jit(nopython=True, cache=True)(_resolve_long)
+    _resolve_short = jit(nopython=True, cache=True)(_resolve_short)
+    _book = jit(nopython=True, cache=True)(_book)
+    hedge_kernel = jit(nopython=True, cache=True)(hedge_kernel)
+
+def _row(tp, sl, direzione, percent_success, ricavi, capitale, perdite, fee_totali, roi, non_chiusi, percent_no_tp_sl):
+    return dict(zip(ROW_FIELDS, (tp, sl, direzione, percent_success, ricavi, capitale, perdite, fee_totali,
+                                 roi, non_chiusi, percent_no_tp_sl)))
+
+def simulate_hedge(arrays, tp_list, sl_list, finestra, capitale_per_trade, fee, periodo=1, exit_mode_close=True,
+                   capitale_iniziale=10000, only_hedge=False, index=None):
+    """Python counterpart of simula (src/simulator.cpp): LONG, SHORT and Hedge rows per TP/SL pair.
+
+    tp/sl are percentages and fee a fraction, as in simula; entries open at
+    the bar open every `periodo` bars and TP/SL are checked on the
+    high/low of the next `finestra` bars. Returns the rows in stampa_riga
+    order (the Hedge row only if neither leg ran out of capital). Pass
+    `index` (FirstPassageIndex over high/low) to reuse it across calls.
+    """
+    high = np.ascontiguousarray(arrays['high'], dtype=np.float64)
+    low = np.ascontiguousarray(arrays['low'], dtype=np.float64)
+    open_ = np.ascontiguousarray(arrays['open'], dtype=np.float64)
+    close = np.ascontiguousarray(arrays['close'], dtype=np.float64)
+    if index is None:
+        index = FirstPassageIndex(high, low)
+    tp_list = np.asarray(tp_list, dtype=np.float64)
+    sl_list = np.asarray(sl_list, dtype=np.float64)
+    ricavi, perdite, fee_totali, successi, fallimenti, non_chiusi, capitale = hedge_kernel(
+        high, low, open_, close, index.maxs, index.mins, index.offsets, index.nlevels, tp_list, sl_list,
+        int(finestra), float(capitale_per_trade), float(fee), max(int(periodo), 1), bool(exit_mode_close),
+        float(capitale_iniziale))
+    totale = successi + fallimenti + non_chiusi
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percent_success = np.where(totale > 0, 100.0 * successi / totale, 0.0)
+        percent_no_tp_sl = np.where(totale > 0, 100.0 * non_chiusi / totale, 0.0)
+
+    rows = []
+    for a, tp in enumerate(tp_list):
+        for b, sl in enumerate(sl_list):
+            p = a * len(sl_list) + b
+            if not only_hedge:
+                for leg, direzione in ((LONG, 'LONG'), (SHORT, 'SHORT')):
+                    roi = ((capitale[p, leg] - capitale_iniziale) / capitale_iniziale) * 100.0
+                    rows.append(_row(tp, sl, direzione, percent_success[p, leg], ricavi[p, leg], capitale[p, leg],
+                                     perdite[p, leg], fee_totali[p, leg], roi, int(non_chiusi[p, leg]),
+                                     percent_no_tp_sl[p, leg]))
+            if (capitale[p] <= capitale_per_trade + 1).any():
+                continue
+            ricavi_totali = ricavi[p, LONG] + ricavi[p, SHORT]
+            perdite_totali = perdite[p, LONG] + perdite[p, SHORT]
+            fee_hedge = fee_totali[p, LONG] + fee_totali[p, SHORT]
+            rows.append(_row(tp, sl, 'Hedge', (percent_success[p, LONG] + percent_success[p, SHORT]) / 2,
+                             ricavi_totali, ricavi_totali - perdite_totali + capitale_iniziale - fee_hedge,
+                             perdite_totali, fee_hedge,
+                             (ricavi_totali - perdite_totali - fee_hedge) / capitale_iniziale * 100,
+                             int(non_chiusi[p, LONG] + non_chiusi[p, SHORT]),
+                             (percent_no_tp_sl[p, LONG] + percent_no_tp_sl[p, SHORT]) / 2.0))
+    return rows
+
+def format_row(row, color=True):
+    """A row formatted like stampa_riga"""
+    colore_roi, reset_colore = ("\033[32m" if row['roi'] >= 0 else "\033[31m", "\033[0m") if color else ("", "")
+    return (f"| {row['tp']:10.5f}% | {row['sl']:10.5f}% | {row['direzione']:>10} "
+            f"| {row['percent_success']:12.2f}% | {row['ricavi']:12.2f} € | {row['capitale']:12.2f} € "
+            f"| {row['perdite']:12.2f} € | {row['fee_totali']:12.2f} € "
+            f"| {colore_roi}{row['roi']:10.2f}% {reset_colore}| {row['non_chiusi']:10d} "
+            f"| {row['percent_no_tp_sl']:10.2f}% |")
+
+def print_table(rows, color=True):
+    print(SEPARATOR)
+    print("| TP %        | SL %        | Direzione  | % Successi    | Ricavi €       | Saldo €        "
+          "| Perdite €      | Fee €          | ROI netto   | No TP/SL   | % No TP/SL |")
+    print(SEPARATOR)
+    for row in rows:
+        print(format_row(row, color))
+    print(SEPARATOR)
+
+def genera_range(min_value, max_value, punti):
+    """TP/SL grid like genera_range in src/dataloader.cpp"""
+    if punti <= 1:
+        return [min_value]
+    step = (max_value - min_value) / (punti - 1)
+    return [min_value + i * step for i in range(punti)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulazione LONG/SHORT/Hedge come il simulatore C++")
+    parser.add_argument('--symbol', type=str, default='BTCUSDT', help='Trading Pair')
+    parser.add_argument('--timeframe', type=str, default='1m', help='Timeframe')
+    parser.add_argument('--window', type=int, default=600, help='Finestra di ogni trade (barre)')
+    parser.add_argument('--tp', type=float, nargs=2, default=[0.01, 0.1], metavar=('MIN', 'MAX'), help='Take Profit (%%)')
+    parser.add_argument('--sl', type=float, nargs=2, default=[0.1, 1.0], metavar=('MIN', 'MAX'), help='Stop Loss (%%)')
+    parser.add_argument('--points', type=int, default=3, help='Punti della griglia TP/SL')
+    parser.add_argument('--capital', type=float, default=100, help='Capitale iniziale')
+    parser.add_argument('--capital_per_trade', type=float, default=10, help='Capitale per trade')
+    parser.add_argument('--fee', type=float, default=0.05, help='Fee per trade (%%)')
+    parser.add_argument('--period', type=int, default=1, help='Barre tra un trade e il successivo')
+    parser.add_argument('--exit_mode', type=str, required=True, choices=['close', 'leave'],
+                        help="close: chiude a fine finestra, leave: il trade resta aperto")
+    parser.add_argument('--only_hedge', action='store_true', help='Stampa solo le righe Hedge')
+    args = parser.parse_args()
+
+    arrays = load_arrays(get_data_filename(args.symbol, args.timeframe))
+    rows = simulate_hedge(arrays, genera_range(args.tp[0], args.tp[1], args.points),
+                          genera_range(args.sl[0], args.sl[1], args.points), args.window, args.capital_per_trade,
+                          args.fee / 100.0, args.period, args.exit_mode == 'close', args.capital, args.only_hedge)
+    print_table(rows)
+
+    n = len(arrays['close'])
+    print(f"\nDati caricati {n - args.window} barre di storico\n")
+    n_trade = (n - args.window) // args.period if n > args.window else 0
+    print(f"\nAnalizzati {n_trade} trade (ogni {args.period} barre)\n")
+    if args.exit_mode == 'leave':
+        print("\n*** ATTENZIONE: Il ROI è calcolato solo sui trade chiusi (TP o SL). "
+              "I trade non chiusi sono esclusi dai risultati. ***\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+import os
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+from data_store import COLUMNS, build_store, append_to_store, csv_fingerprint
+
+KLINE_COLUMNS = [
+    'timestamp', 'open', 'high', 'low', 'close', 'volume',
+    'close_time', 'quote_asset_volume', 'number_of_trades',
+    'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+]
+
+# Durata di una candela in millisecondi per ogni intervallo Binance
+INTERVAL_MS = {
+    '1m': 60_000,
+    '3m': 3 * 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 3_600_000,
+    '2h': 2 * 3_600_000,
+    '4h': 4 * 3_600_000,
+    '6h': 6 * 3_600_000,
+    '8h': 8 * 3_600_000,
+    '12h': 12 * 3_600_000,
+    '1d': 86_400_000,
+    '3d': 3 * 86_400_000,
+    '1w': 7 * 86_400_000,
+}
+
+PAGE_LIMIT = 1000
+
+def get_days_for_timeframe(timeframe):
+    # Scarica almeno 3 anni per ogni timeframe
+    return 3 * 365
+
+def get_client():
+    """Real Binance client, imported lazily so offline tools do not need python-binance"""
+    from binance.client import Client
+    return Client()
+
+def to_ms(value):
+    """Convert a date string, datetime or Timestamp (UTC) to epoch milliseconds"""
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+def now_ms():
+    return int(time.time() * 1000)
+
+def client_now_ms(client):
+    """Current time of the client (Binance server time, or the stub's clock); local clock as fallback"""
+    if hasattr(client, 'get_server_time'):
+        return int(client.get_server_time()['serverTime'])
+    return now_ms()
+
+def get_data_filename(symbol, timeframe):
+    return os.path.join('csv', f'{symbol.lower()}_{timeframe}.csv')
+
+def backoff_delay(attempt, base=1.0, max_delay=60.0):
+    """Exponential backoff with jitter: ~base, 2*base, 4*base, ... capped at max_delay"""
+    return min(max_delay, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def iter_kline_pages(client, symbol, interval, start_ms, end_ms=None, progress_callback=None,
+                     backoff=1.0, max_retries=8):
+    """Yield pages of raw klines (max PAGE_LIMIT each) from start_ms to end_ms"""
+    if end_ms is None:
+        end_ms = now_ms()
+    current = start_ms
+    attempt = 0
+    while current <= end_ms:
+        try:
+            klines = client.get_klines(symbol=symbol, interval=interval,
+                                       startTime=current, endTime=end_ms, limit=PAGE_LIMIT)
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt, backoff)
+            attempt += 1
+            if progress_callback:
+                progress_callback(f"Error: {e}. Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        attempt = 0
+        if not klines:
+            break
+        yield klines
+        current = klines[-1][0] + 1
+        if len(klines) < PAGE_LIMIT:
+            break
+
+def klines_to_frame(klines):
+    """Convert raw Binance klines to the DataFrame layout stored in csv/"""
+    df = pd.DataFrame(klines, columns=KLINE_COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        df[col] = df[col].astype(float)
+    df.set_index('timestamp', inplace=True)
+    return df
+
+def report_progress(progress_callback, klines, start_ms, end_ms):
+    if progress_callback:
+        progress = (klines[-1][0] - start_ms) / max(1, end_ms - start_ms) * 100
+        progress_callback(f"Downloading... {min(100, progress):.1f}%")
+
+def create_kline_file(filename):
+    """Write an empty kline CSV (header only) and its empty columnar store"""
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    pd.DataFrame(columns=KLINE_COLUMNS).set_index('timestamp').to_csv(filename)
+    build_store(filename)
+
+def append_klines(filename, klines):
+    """Append one page of klines to the CSV and to the columnar store"""
+    fingerprint = csv_fingerprint(filename)
+    df = klines_to_frame(klines)
+    df.to_csv(filename, mode='a', header=False)
+    arrays = {'timestamp': np.array([k[0] for k in klines], dtype=np.int64)}
+    for col in COLUMNS[1:]:
+        arrays[col] = df[col].to_numpy()
+    append_to_store(filename, arrays, fingerprint)
+
+def stream_klines_to_file(client, symbol, interval, filename, start_ms, end_ms, progress_callback=None):
+    """Write every page to disk as soon as it arrives.
+
+    Only one page (PAGE_LIMIT rows) is held in memory and the file is valid
+    after each page, so an interrupted download resumes from its last row.
+    Candles not yet closed at end_ms are skipped. Returns the rows written.
+    """
+    drop_partial_line(filename)
+    last_ts = read_last_timestamp(filename)
+    rows = 0
+    for page in iter_kline_pages(client, symbol, interval, start_ms, end_ms, progress_callback):
+        klines, missing = check_seam(last_ts, [k for k in page if int(k[6]) < end_ms], interval)
+        if missing > 0 and progress_callback:
+            progress_callback(f"Warning: {missing} bars missing in {symbol} {interval} after {pd.Timestamp(last_ts, unit='ms')}")
+        if not klines:
+            continue
+        append_klines(filename, klines)
+        last_ts = klines[-1][0]
+        rows += len(klines)
+        report_progress(progress_callback, klines, start_ms, end_ms)
+    return rows
+
+def _read_tail(filename, size=4096):
+    with open(filename, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        f.seek(max(0, end - size))
+        return f.read(), end
+
+def read_last_timestamp(filename):
+    """Open time (epoch ms) of the last complete row of a kline CSV, reading only its tail.
+
+    A last line without its newline (write interrupted) is ignored.
+    """
+    tail, _ = _read_tail(filename)
+    lines = tail.split(b'\n')[:-1]
+    for line in reversed(lines):
+        field = line.split(b',', 1)[0].decode()
+        if field and field != 'timestamp':
+            return to_ms(field)
+    return None
+
+def drop_partial_line(filename):
+    """Truncate a last line left without its newline by an interrupted write"""
+    tail, end = _read_tail(filename)
+    if tail and not tail.endswith(b'\n') and b'\n' in tail:
+        with open(filename, 'r+b') as f:
+            f.truncate(end - (len(tail) - tail.rindex(b'\n') - 1))
+
+def check_seam(last_ts, klines, interval):
+    """Drop klines already stored and check continuity with the last stored bar.
+
+    Returns the new klines and the number of missing bars between the file
+    and the first new kline (0 when the seam is continuous).
+    """
+    step = INTERVAL_MS[interval]
+    new = klines if last_ts is None else [k for k in klines if k[0] > last_ts]
+    for prev, cur in zip(new, new[1:]):
+        if cur[0] <= prev[0]:
+            raise ValueError(f"Klines not strictly increasing at {cur[0]}")
+    missing = 0
+    if new and last_ts is not None:
+        missing = (new[0][0] - last_ts) // step - 1
+    return new, missing
+
+def update_kline_file(symbol, interval, filename=None, client=None, progress_callback=None, days=None, now=None):
+    """Append only the klines newer than the last stored row of the CSV.
+
+    A missing or empty file starts the usual download of `days` days
+    (default get_days_for_timeframe(interval)); a partial download is
+    resumed from its last row. Candles not yet closed are never written,
+    so the file stays append-only. "Now" is `now` (epoch ms) or the
+    client's clock, and the first day is counted in UTC. Returns the
+    number of new rows.
+    """
+    if filename is None:
+        filename = get_data_filename(symbol, interval)
+    if client is None:
+        client = get_client()
+    end = now if now is not None else client_now_ms(client)
+    last_ts = read_last_timestamp(filename) if os.path.exists(filename) else None
+
+    if last_ts is None:
+        if days is None:
+            days = get_days_for_timeframe(interval)
+        # Mezzanotte UTC di `days` giorni fa, come la vecchia data YYYY-MM-DD
+        start = to_ms(pd.Timestamp(end, unit='ms').normalize() - pd.Timedelta(days=days))
+        create_kline_file(filename)
+        if progress_callback:
+            progress_callback(f"Downloading {symbol} {interval} data for {days} days...")
+    else:
+        start = last_ts + 1
+
+    rows = stream_klines_to_file(client, symbol, interval, filename, start, end, progress_callback)
+    if progress_callback:
+        if rows:
+            progress_callback(f"Appended {rows} rows to {filename}")
+        else:
+            progress_callback(f"{filename} already up to date")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggiornamento incrementale dei CSV di klines")
+    parser.add_argument('--symbols', type=str, nargs='+', default=['BTCUSDT'], help='Trading Pairs')
+    parser.add_argument('--timeframes', type=str, nargs='+', default=['1h'], help='Timeframes')
+    parser.add_argument('--offline', action='store_true', help='Usa il client Binance simulato (binance_stub)')
+    args = parser.parse_args()
+
+    if args.offline:
+        from binance_stub import StubClient
+        client = StubClient()
+    else:
+        client = get_client()
+    for symbol in args.symbols:
+        for timeframe in args.timeframes:
+            update_kline_file(symbol, timeframe, client=client, progress_callback=print)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+
+# Metriche riassunte sull'ensemble e quantili riportati
+ENSEMBLE_METRICS = ('pnl', 'sharpe', 'annual_return', 'max_drawdown', 'win_rate', 'total_trades', 'vwr')
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+def replica_seeds(seed, replicas):
+    """Independent SeedSequence streams, one per replica, spawned from `seed`"""
+    return np.random.SeedSequence(seed).spawn(replicas)
+
+def python_seed(seed):
+    """Integer seed for random.Random (backtrader strategy) from a SeedSequence or int"""
+    if isinstance(seed, np.random.SeedSequence):
+        return int(seed.generate_state(1, np.uint64)[0])
+    return seed
+
+def _run_replica(task):
+    backtest, seed = task
+    return backtest(seed=seed)
+
+def run_ensemble(backtest, replicas=100, seed=None, num_cpus=1):
+    """Run `replicas` seeded copies of backtest(seed=...) and return their result dicts.
+
+    Each replica gets its own SeedSequence child, so the ensemble is
+    reproducible from `seed` and replicas are statistically independent.
+    With num_cpus > 1 replicas run in a Pool (backtest must be picklable,
+    e.g. a functools.partial of a module-level function).
+    """
+    tasks = [(backtest, child) for child in replica_seeds(seed, replicas)]
+    if num_cpus == 1:
+        return [_run_replica(task) for task in tasks]
+    with Pool(num_cpus) as pool:
+        return pool.map(_run_replica, tasks)
+
+def summarize_ensemble(results, metrics=ENSEMBLE_METRICS, quantiles=QUANTILES):
+    """Mean, standard deviation and quantiles of each metric over the replicas"""
+    frame = pd.DataFrame([{key: result[key] for key in metrics} for result in results], dtype=float)
+    summary = pd.DataFrame({'mean': frame.mean(), 'std': frame.std()})
+    for q in quantiles:
+        summary[f"q{int(round(q * 100)):02d}"] = frame.quantile(q)
+    summary['replicas'] = frame.count()
+    return summary
@@ -0,0 +1,217 @@
+import os
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from data_store import get_store_dir, load_arrays, read_meta
+from fast_engine import (EXIT_TP, EXIT_SL, EXIT_TIME, COUNTER_NAMES, MIN_SIZE, make_sides,
+                         equity_from_steps, compute_metrics)
+from first_passage import FirstPassageIndex
+from kline_fetcher import get_data_filename
+try:
+    from numba import jit
+    numba_available = True
+except ImportError:
+    numba_available = False
+
+OUTCOMES_DIRNAME = 'outcomes'
+SIDES = {'LONG': (1,), 'SHORT': (-1,), 'BOTH': (1, -1)}
+
+def build_outcome_table(arrays, tp, sl, max_hold, side, index=None):
+    """Exit of a trade signalled at every bar, for fixed (tp, sl, max_hold, side).
+
+    exit_signal[i] is the bar whose close triggers the exit of a trade
+    signalled on bar i (-1 if the data ends first) and reason[i] one of
+    EXIT_TP/EXIT_SL/EXIT_TIME. None of it depends on entry_period or
+    sizing, so one table serves every such combination. `index` is a
+    FirstPassageIndex or CoarseToFineScanner over the closes.
+    """
+    close = np.ascontiguousarray(arrays['close'], dtype=np.float64)
+    n = len(close)
+    if index is None:
+        index = FirstPassageIndex(close)
+    hold = max(max_hold, 1)
+    starts = np.arange(1, n + 1, dtype=np.int64)
+    stops = np.minimum(starts + hold, n)
+    # Stesse formule di calculate_exit_prices_py
+    if side > 0:
+        tp_price, sl_price = close * (1 + tp), close * (1 - sl)
+        hits = index.first_passages(starts, stops, tp_price, sl_price)
+        by_tp = close[np.maximum(hits, 0)] >= tp_price
+    else:
+        tp_price, sl_price = close * (1 - tp), close * (1 + sl)
+        hits = index.first_passages(starts, stops, sl_price, tp_price)
+        by_tp = close[np.maximum(hits, 0)] <= tp_price
+    reason = np.where(by_tp, EXIT_TP, EXIT_SL).astype(np.int8)
+    timed = (hits < 0) & (starts + hold <= n)
+    exit_signal = np.where(timed, starts + hold - 1, hits)
+    reason[timed] = EXIT_TIME
+    reason[exit_signal < 0] = -1
+    return {'exit_signal': exit_signal, 'reason': reason}
+
+def get_outcome_path(filename, tp, sl, max_hold, side):
+    # float(): uno scalare NumPy avrebbe repr 'np.float64(0.01)', cioè un secondo nome per la stessa tabella
+    name = f"{'long' if side > 0 else 'short'}_tp{float(tp)!r}_sl{float(sl)!r}_hold{int(max_hold)}.npz"
+    return os.path.join(get_store_dir(filename), OUTCOMES_DIRNAME, name)
+
+def load_outcome_table(filename, tp, sl, max_hold, side, arrays=None, index=None):
+    """Outcome table of a data file, built once and kept next to its store.
+
+    The table is rebuilt when the checksum or row count of the data change.
+    """
+    if arrays is None:
+        arrays = load_arrays(filename)
+    meta = read_meta(filename)
+    path = get_outcome_path(filename, tp, sl, max_hold, side)
+    if os.path.exists(path):
+        with np.load(path) as saved:
+            if saved['checksum'] == meta['checksum'] and saved['rows'] == meta['rows']:
+                return {'exit_signal': saved['exit_signal'], 'reason': saved['reason']}
+    table = build_outcome_table(arrays, tp, sl, max_hold, side, index)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, checksum=meta['checksum'], rows=meta['rows'], **table)
+    os.replace(tmp, path)
+    return table
+
+def walk_outcomes(open_, close, sides, exit_long, reason_long, exit_short, reason_short,
+                  commission, initial_cash, size_pct, entry_period):
+    """Skip-ahead walk of RandomEntryTPSL over the outcome tables.
+
+    Jumps from each entry straight to its exit fill and from there to the
+    next allowed entry, so the work is O(1) per trade. Returns the trade
+    records (entry/exit bar, position, cash after each fill, net pnl) and
+    the tp/sl/time exit counters.
+    """
+    n = len(close)
+    max_trades = n // max(entry_period, 2) + 1
+    entry_bar = np.full(max_trades, -1, dtype=np.int64)
+    exit_bar = np.full(max_trades, -1, dtype=np.int64)
+    position = np.zeros(max_trades)
+    entry_cash = np.zeros(max_trades)
+    exit_cash = np.full(max_trades, np.nan)
+    pnlcomm = np.full(max_trades, np.nan)
+    counters = np.zeros(3, dtype=np.int64)
+    cash = initial_cash
+    trades = 0
+    i = 0
+    while i < n - 1:
+        size = cash * size_pct / close[i]
+        if size < MIN_SIZE:
+            i += 1
+            continue
+        side = sides[i]
+        if side > 0:
+            signal = exit_long[i]
+            reason = reason_long[i]
+        else:
+            signal = exit_short[i]
+            reason = reason_short[i]
+        fill = i + 1
+        entry_price = open_[fill]
+        entry_comm = size * entry_price * commission
+        cash -= side * size * entry_price + entry_comm
+        t = trades
+        trades += 1
+        entry_bar[t] = fill
+        position[t] = side * size
+        entry_cash[t] = cash
+        if signal < 0:
+            break
+        counters[reason] += 1
+        if signal + 1 >= n:
+            break
+        exit_price = open_[signal + 1]
+        exit_comm = size * exit_price * commission
+        cash += side * size * exit_price - exit_comm
+        exit_bar[t] = signal + 1
+        exit_cash[t] = cash
+        pnlcomm[t] = side * size * (exit_price - entry_price) - entry_comm - exit_comm
+        i = max(signal + 1, i + entry_period)
+    return (entry_bar[:trades], exit_bar[:trades], position[:trades], entry_cash[:trades],
+            exit_cash[:trades], pnlcomm[:trades], counters)
+
+if numba_available:
+    walk_outcomes = jit(nopython=True, cache=True)(walk_outcomes)
+
+def run_table_backtest(arrays, outcomes, commission, initial_cash, size_pct, entry_period,
+                       trade_type='LONG', rng=None, sides=None):
+    """Backtest result dict from the outcome tables ({side: table}) of one (tp, sl, max_hold)"""
+    close = np.ascontiguousarray(arrays['close'], dtype=np.float64)
+    open_ = np.ascontiguousarray(arrays['open'], dtype=np.float64)
+    if sides is None:
+        sides = make_sides(trade_type, len(close), rng)
+    long_table = outcomes.get(1, outcomes.get(-1))
+    short_table = outcomes.get(-1, long_table)
+    entry_bar, exit_bar, position, entry_cash, exit_cash, pnlcomm, counters = walk_outcomes(
+        open_, close, sides, long_table['exit_signal'], long_table['reason'],
+        short_table['exit_signal'], short_table['reason'], commission, initial_cash, size_pct, entry_period)
+    closed = exit_bar >= 0
+    # Passi di cassa/posizione: ingresso e uscita di ogni trade, in ordine di barra
+    bars = np.column_stack([entry_bar, exit_bar]).ravel()
+    cash_levels = np.column_stack([entry_cash, exit_cash]).ravel()
+    pos_levels = np.column_stack([position, np.zeros(len(position))]).ravel()
+    keep = np.column_stack([np.ones(len(closed), dtype=bool), closed]).ravel()
+    value = equity_from_steps(close, bars[keep], cash_levels[keep], pos_levels[keep], initial_cash)
+    return compute_metrics(np.asarray(arrays['timestamp']), value, initial_cash, len(entry_bar),
+                           pnlcomm[closed], dict(zip(COUNTER_NAMES, counters)))
+
+def sweep(filename, tp_values, sl_values, max_hold_values, entry_periods, size_pcts=(0.1,),
+          initial_cash=100000, commission=0.0005, trade_type='LONG', rng=None, index=None):
+    """tp x sl x max_hold x entry_period x size_pct sweep walking the outcome tables.
+
+    Exits are searched once per (tp, sl, max_hold) when the tables are
+    built; every entry_period/sizing run is then a compiled skip-ahead
+    walk with O(1) work per trade. Returns one row per combo with the
+    result dict of run_single_backtest. The long/short sides are drawn
+    once from rng and shared by every combo (common random numbers).
+    `index` searches the exits (FirstPassageIndex over the closes if None,
+    or a CoarseToFineScanner).
+    """
+    arrays = load_arrays(filename)
+    if index is None:
+        index = FirstPassageIndex(arrays['close'])
+    sides = make_sides(trade_type, len(arrays['close']), rng)
+    rows = []
+    for tp, sl, max_hold in itertools.product(tp_values, sl_values, max_hold_values):
+        outcomes = {side: load_outcome_table(filename, tp, sl, max_hold, side, arrays, index)
+                    for side in SIDES[trade_type.upper()]}
+        for entry_period, size_pct in itertools.product(entry_periods, size_pcts):
+            result = run_table_backtest(arrays, outcomes, commission, initial_cash, size_pct, entry_period,
+                                        trade_type, sides=sides)
+            rows.append({'tp': tp, 'sl': sl, 'max_hold': max_hold, 'entry_period': entry_period,
+                         'size_pct': size_pct, **result})
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep TP/SL/max_hold/entry_period con tabelle degli esiti precalcolate")
+    parser.add_argument('--symbol', type=str, default='BTCUSDT', help='Trading Pair')
+    parser.add_argument('--timeframe', type=str, default='15m', help='Timeframe')
+    parser.add_argument('--tp', type=float, nargs='+', default=[0.005, 0.01, 0.02], help='Valori di Take Profit')
+    parser.add_argument('--sl', type=float, nargs='+', default=[0.005, 0.01, 0.02], help='Valori di Stop Loss')
+    parser.add_argument('--max_hold', type=int, nargs='+', default=[300, 3000], help='Valori di Max Hold (bars)')
+    parser.add_argument('--entry_period', type=int, nargs='+', default=[5, 10, 20], help='Valori di Entry Period (bars)')
+    parser.add_argument('--size_pct', type=float, nargs='+', default=[0.1], help='Valori di Position Size')
+    parser.add_argument('--commission', type=float, default=0.0005, help='Commission (%)')
+    parser.add_argument('--initial_cash', type=float, default=100000, help='Initial Cash')
+    parser.add_argument('--trade_type', type=str, default='LONG', choices=['LONG', 'SHORT', 'BOTH'], help='Trade Type')
+    parser.add_argument('--coarse', action='store_true',
+                        help='Cerca le uscite con CoarseToFineScanner (blocchi orari) invece di FirstPassageIndex')
+    parser.add_argument('--output', type=str, default=None, help='CSV dei risultati')
+    args = parser.parse_args()
+
+    filename = get_data_filename(args.symbol, args.timeframe)
+    index = None
+    if args.coarse:
+        from coarse_scanner import CoarseToFineScanner
+        index = CoarseToFineScanner.from_arrays(load_arrays(filename))
+    results = sweep(filename, args.tp, args.sl, args.max_hold, args.entry_period, args.size_pct,
+                    args.initial_cash, args.commission, args.trade_type, index=index)
+    results = results.sort_values('pnl', ascending=False)
+    print(results[['tp', 'sl', 'max_hold', 'entry_period', 'size_pct', 'pnl', 'sharpe',
+                   'max_drawdown', 'total_trades', 'win_rate']].to_string(index=False))
+    if args.output:
+        results.to_csv(args.output, index=False)
+
+if __name__ == "__main__":
+    main()
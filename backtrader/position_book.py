@@ -0,0 +1,171 @@
+import numpy as np
+from fast_engine import (EXIT_TP, EXIT_SL, EXIT_TIME, COUNTER_NAMES, MIN_SIZE, make_sides,
+                         equity_from_steps, compute_metrics)
+
+class PositionBook:
+    """Open positions stored as parallel NumPy arrays.
+
+    Positions live densely in the first `count` slots of side, size,
+    entry_price, tp_price, sl_price, open_bar and expiry_bar; capacity
+    doubles when full and closing compacts the arrays. check_exits tests
+    every open position against a price in one vectorized step, and the
+    book caches the nearest TP/SL levels above and below and the first
+    expiry, so bars where nothing can trigger cost O(1) regardless of how
+    many positions are open.
+    """
+
+    FIELDS = (('side', np.int8), ('size', np.float64), ('entry_price', np.float64), ('tp_price', np.float64),
+              ('sl_price', np.float64), ('open_bar', np.int64), ('expiry_bar', np.int64))
+
+    def __init__(self, capacity=1024):
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.empty(max(capacity, 1), dtype=dtype))
+        self.count = 0
+        self.net_position = 0.0
+        self._refresh_bounds()
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        for name, _ in self.FIELDS:
+            old = getattr(self, name)
+            new = np.empty(2 * len(old), dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def _refresh_bounds(self):
+        # Soglie più vicine: long TP/short SL sopra, long SL/short TP sotto
+        if self.count == 0:
+            self.upper = np.inf
+            self.lower = -np.inf
+            self.next_expiry = np.iinfo(np.int64).max
+            return
+        long_ = self.side[:self.count] > 0
+        tp, sl = self.tp_price[:self.count], self.sl_price[:self.count]
+        self.upper = float(np.where(long_, tp, sl).min())
+        self.lower = float(np.where(long_, sl, tp).max())
+        self.next_expiry = int(self.expiry_bar[:self.count].min())
+
+    def open(self, side, size, entry_price, tp_price, sl_price, open_bar, expiry_bar):
+        """Add a position and return its slot"""
+        if self.count == len(self.side):
+            self._grow()
+        k = self.count
+        self.side[k] = side
+        self.size[k] = size
+        self.entry_price[k] = entry_price
+        self.tp_price[k] = tp_price
+        self.sl_price[k] = sl_price
+        self.open_bar[k] = open_bar
+        self.expiry_bar[k] = expiry_bar
+        self.count += 1
+        self.net_position += side * size
+        if side > 0:
+            self.upper = min(self.upper, tp_price)
+            self.lower = max(self.lower, sl_price)
+        else:
+            self.upper = min(self.upper, sl_price)
+            self.lower = max(self.lower, tp_price)
+        self.next_expiry = min(self.next_expiry, expiry_bar)
+        return k
+
+    def check_exits(self, price, bar):
+        """Slots whose TP, SL or expiry is reached at `price` on `bar`, with the exit reason.
+
+        TP wins over SL and both over the time exit, as in RandomEntryTPSL.
+        """
+        if self.lower < price < self.upper and bar < self.next_expiry:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8)
+        side = self.side[:self.count]
+        tp, sl = self.tp_price[:self.count], self.sl_price[:self.count]
+        by_tp = np.where(side > 0, price >= tp, price <= tp)
+        by_sl = np.where(side > 0, price <= sl, price >= sl)
+        by_time = self.expiry_bar[:self.count] <= bar
+        slots = np.flatnonzero(by_tp | by_sl | by_time)
+        reasons = np.where(by_tp[slots], EXIT_TP, np.where(by_sl[slots], EXIT_SL, EXIT_TIME)).astype(np.int8)
+        return slots, reasons
+
+    def close(self, slots):
+        """Remove positions `slots` and return their fields as a dict of arrays"""
+        closed = {name: getattr(self, name)[slots].copy() for name, _ in self.FIELDS}
+        keep = np.ones(self.count, dtype=bool)
+        keep[slots] = False
+        remaining = int(keep.sum())
+        for name, _ in self.FIELDS:
+            values = getattr(self, name)
+            values[:remaining] = values[:self.count][keep]
+        self.count = remaining
+        self.net_position = float(np.dot(self.side[:remaining], self.size[:remaining]))
+        self._refresh_bounds()
+        return closed
+
+def run_book_backtest(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold,
+                      trade_type='LONG', rng=None, sides=None):
+    """RandomEntryTPSL with overlapping positions kept in a PositionBook.
+
+    An entry is signalled every entry_period bars even while other
+    positions are open; each position has its own TP/SL (on the close,
+    against the signal close) and max_hold, and fills at the next open
+    like the backtrader strategy. With entry_period > max_hold + 1 no two
+    positions overlap and the result equals run_fast_backtest.
+    """
+    close = np.asarray(arrays['close'], dtype=np.float64)
+    open_ = np.asarray(arrays['open'], dtype=np.float64)
+    n = len(close)
+    if sides is None:
+        sides = make_sides(trade_type, n, rng)
+    hold = max(max_hold, 1)
+    book = PositionBook()
+    cash = float(initial_cash)
+    counters = dict.fromkeys(COUNTER_NAMES, 0)
+    step_bar, step_cash, step_pos = [], [], []
+    closed_pnl = []
+    total_trades = 0
+    # Uscite e ingresso segnalati sulla chiusura precedente, eseguiti all'apertura
+    exiting = np.empty(0, dtype=np.int64)
+    entry = None
+    next_entry = 0
+    for bar in range(n):
+        if len(exiting) or entry is not None:
+            price = open_[bar]
+            if len(exiting):
+                done = book.close(exiting)
+                position = done['side'] * done['size']
+                exit_comm = done['size'] * price * commission
+                cash += float((position * price - exit_comm).sum())
+                entry_comm = done['size'] * done['entry_price'] * commission
+                closed_pnl.extend(position * (price - done['entry_price']) - entry_comm - exit_comm)
+                exiting = np.empty(0, dtype=np.int64)
+            if entry is not None:
+                side, size, tp_price, sl_price = entry
+                cash -= side * size * price + size * price * commission
+                book.open(side, size, price, tp_price, sl_price, bar, bar + hold - 1)
+                total_trades += 1
+                entry = None
+            step_bar.append(bar)
+            step_cash.append(cash)
+            step_pos.append(book.net_position)
+        if bar == n - 1:
+            break
+        price = close[bar]
+        slots, reasons = book.check_exits(price, bar)
+        if len(slots):
+            for reason in reasons:
+                counters[COUNTER_NAMES[reason]] += 1
+            exiting = slots
+        if bar >= next_entry:
+            # Dimensione sul valore del conto, come broker.getvalue() nella strategia
+            size = (cash + book.net_position * price) * size_pct / price
+            if size < MIN_SIZE:
+                continue
+            side = int(sides[bar])
+            if side > 0:
+                entry = (1, size, price * (1 + tp), price * (1 - sl))
+            else:
+                entry = (-1, size, price * (1 - tp), price * (1 + sl))
+            next_entry = bar + entry_period
+
+    value = equity_from_steps(close, step_bar, step_cash, step_pos, initial_cash)
+    return compute_metrics(np.asarray(arrays['timestamp']), value, initial_cash, total_trades,
+                           np.array(closed_pnl), counters)
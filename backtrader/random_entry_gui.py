@@ -4,18 +4,22 @@ from tkinter import PhotoImage
 from tkinter import messagebox
 import threading
 from random_entry_strategy import RandomEntryTPSL
+from data_store import arrays_to_dataframe, get_date_limits, list_available
+from shared_data import SharedDataset, init_worker, get_dataset
+from kline_fetcher import update_kline_file
+from download_scheduler import download_all
+from resample import ensure_resampled
+from result_cache import ResultCache, result_key
 import backtrader as bt
 import pandas as pd
-from datetime import datetime, timedelta
 import time
 import os
 from PIL import Image, ImageTk
 from binance.client import Client
-from tqdm import tqdm
 from tkcalendar import DateEntry
-import numpy as np
 import matplotlib.pyplot as plt
 from multiprocessing import Pool, cpu_count
+from functools import partial
 
 class ProgressStrategy(RandomEntryTPSL):
     def __init__(self, *args, **kwargs):
@@ -52,112 +56,14 @@ class ProgressStrategy(RandomEntryTPSL):
         
         super().next()
 
-def get_days_for_timeframe(timeframe):
-    # Scarica almeno 3 anni per ogni timeframe
-    return 3 * 365
-
-def fetch_historical_klines(symbol, interval, start_str, end_str=None, progress_callback=None):
-    """Fetch historical klines/candlestick data from Binance"""
-    client = Client()
-    
-    # Convert start_str to datetime if it's a string
-    if isinstance(start_str, str):
-        start_str = datetime.strptime(start_str, "%Y-%m-%d")
-    
-    # If end_str is not provided, use current time
-    if end_str is None:
-        end_str = datetime.now()
-    elif isinstance(end_str, str):
-        end_str = datetime.strptime(end_str, "%Y-%m-%d")
-    
-    # Initialize empty list to store all klines
-    all_klines = []
-    
-    # Calculate total time range
-    total_days = (end_str - start_str).days
-    if progress_callback:
-        progress_callback(f"Downloading {symbol} {interval} data for {total_days} days...")
-    
-    # Fetch data in chunks to avoid hitting rate limits
-    current_start = start_str
-    days_processed = 0
-    
-    while current_start < end_str:
-        try:
-            # Fetch klines
-            klines = client.get_historical_klines(
-                symbol,
-                interval,
-                current_start.strftime("%Y-%m-%d %H:%M:%S"),
-                end_str.strftime("%Y-%m-%d %H:%M:%S"),
-                limit=1000
-            )
-            
-            if not klines:
-                break
-                
-            all_klines.extend(klines)
-            
-            # Update progress
-            days_processed = (datetime.fromtimestamp(klines[-1][0] / 1000) - start_str).days
-            if progress_callback:
-                progress = min(100, (days_processed / total_days) * 100)
-                progress_callback(f"Downloading... {progress:.1f}%")
-            
-            # Update start time for next iteration
-            current_start = datetime.fromtimestamp(klines[-1][0] / 1000) + timedelta(seconds=1)
-            
-            # Sleep to avoid hitting rate limits
-            time.sleep(0.1)
-            
-        except Exception as e:
-            if progress_callback:
-                progress_callback(f"Error: {e}. Retrying...")
-            time.sleep(5)
-            continue
-    
-    if not all_klines:
-        raise Exception(f"No data fetched for {symbol} {interval}")
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(all_klines, columns=[
-        'timestamp', 'open', 'high', 'low', 'close', 'volume',
-        'close_time', 'quote_asset_volume', 'number_of_trades',
-        'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-    ])
-    
-    # Convert timestamp to datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    
-    # Convert string values to float
-    for col in ['open', 'high', 'low', 'close', 'volume']:
-        df[col] = df[col].astype(float)
-    
-    # Set timestamp as index
-    df.set_index('timestamp', inplace=True)
-    
-    return df
-
 def ensure_data_file(symbol, timeframe, progress_callback=None):
     """Ensure that the data file exists, download if necessary"""
-    filename = os.path.join('csv', f'{symbol.lower()}_{timeframe}.csv')
+    filename = ensure_resampled(symbol, timeframe) or os.path.join('csv', f'{symbol.lower()}_{timeframe}.csv')
     
     if not os.path.exists(filename):
         if progress_callback:
             progress_callback(f"File {filename} not found. Downloading...")
-        
-        # Calculate start date based on timeframe
-        days = get_days_for_timeframe(timeframe)
-        start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-        
-        # Download data
-        df = fetch_historical_klines(symbol, timeframe, start_date, progress_callback=progress_callback)
-        
-        # Save to CSV
-        df.to_csv(filename)
-        
-        if progress_callback:
-            progress_callback(f"Downloaded and saved {len(df)} rows to {filename}")
+        update_kline_file(symbol, timeframe, filename=filename, progress_callback=progress_callback)
     
     return filename
 
@@ -200,14 +106,24 @@ def update_cash_label():
 def get_csv_date_limits(symbol, timeframe):
     filename = os.path.join('csv', f'{symbol.lower()}_{timeframe}.csv')
     try:
-        df = pd.read_csv(filename, usecols=[0], parse_dates=[0])
-        min_date = df.iloc[0, 0]
-        max_date = df.iloc[-1, 0]
-        return pd.to_datetime(min_date), pd.to_datetime(max_date)
+        # Letti dal catalogo dei metadati, senza aprire il CSV
+        return get_date_limits(filename)
     except Exception:
         return None, None
 
-def run_single_backtest(args):
+def clip_dates(filename, start_date, end_date, file_known=True):
+    """Picker dates to use on filename: None (whole history) when unset or outside the file range"""
+    first, last = get_date_limits(filename)
+    if not file_known or first is None:
+        return None, None
+    first, last = first.date(), last.date()
+    if start_date is None or not first <= start_date <= last:
+        start_date = None
+    if end_date is None or not first <= end_date <= last:
+        end_date = None
+    return start_date, end_date
+
+def run_single_backtest(args, start=None, end=None):
     tp, sl, symbol, timeframe, commission, initial_cash, size_pct, entry_period, max_hold, trade_type, use_numba = args
     
     cerebro = bt.Cerebro()
@@ -216,10 +132,9 @@ def run_single_backtest(args):
     except Exception as e:
         raise Exception(f"Failed to get data for {symbol} {timeframe}: {e}")
         
-    df = pd.read_csv(filename, parse_dates=[0])
-    df.columns = ['datetime', 'open', 'high', 'low', 'close', 'volume'] + list(df.columns[6:])
-    df['datetime'] = pd.to_datetime(df['datetime'])
-    df.set_index('datetime', inplace=True)
+    df = arrays_to_dataframe(get_dataset(filename, start, end))
+    if df.empty:
+        raise Exception(f"No data in {filename} between {start} and {end}")
     
     start_date = df.index[0]
     end_date = df.index[-1]
@@ -278,20 +193,24 @@ def run_single_backtest(args):
         'end_date': end_date,
         'duration_days': duration_days,
         'duration_years': duration_years,
-        'elapsed': results[1],
-        'num_cpus': results[2],
         'use_numba': use_numba
     }
 
-def run_backtest(tp, sl, symbol, timeframe, commission, initial_cash, size_pct, entry_period, max_hold, trade_type, num_cpus, use_numba, progress_callback=None):
+def run_backtest(tp, sl, symbol, timeframe, commission, initial_cash, size_pct, entry_period, max_hold, trade_type, num_cpus, use_numba, progress_callback=None, start_date=None, end_date=None):
     print(f"Running backtests using {num_cpus} CPU cores...")
     args = (tp, sl, symbol, timeframe, commission, initial_cash, size_pct, entry_period, max_hold, trade_type, use_numba)
     start_time = time.time()
     # Se vuoi batch/grid, args_list = [(...), (...), ...]
     args_list = [args]  # Per ora solo una simulazione
     if len(args_list) == 1 or num_cpus == 1:
-        # Caso singola simulazione: nessun multiprocessing
-        result = run_single_backtest(args)
+        # Caso singola simulazione: nessun multiprocessing, risultato dalla cache se già calcolato
+        filename = ensure_data_file(symbol, timeframe, progress_callback)
+        cache = ResultCache.for_data(filename)
+        key = result_key(filename, args, start_date, end_date)
+        result = cache.get(key)
+        if result is None:
+            result = run_single_backtest(args, start_date, end_date)
+            cache.put(key, result)
         elapsed = time.time() - start_time
         result['elapsed'] = elapsed
         result['num_cpus'] = 1
@@ -299,8 +218,10 @@ def run_backtest(tp, sl, symbol, timeframe, commission, initial_cash, size_pct,
         return result
     else:
         # Caso batch/grid: multiprocessing
-        with Pool(num_cpus) as pool:
-            results = pool.map(run_single_backtest, args_list)
+        filename = ensure_data_file(symbol, timeframe, progress_callback)
+        with SharedDataset(filename) as dataset:
+            with Pool(num_cpus, initializer=init_worker, initargs=(dataset.spec,)) as pool:
+                results = pool.map(partial(run_single_backtest, start=start_date, end=end_date), args_list)
         elapsed = time.time() - start_time
         # Qui results è una lista di dict, per ora ne restituiamo solo il primo
         results[0]['elapsed'] = elapsed
@@ -323,18 +244,27 @@ def run_test():
     max_hold = int(exit_bars_entry.get())
     plot_enabled = plot_var.get()
     trade_type = trade_type_var.get()
+    start_date = start_date_picker.get_date()
+    end_date = end_date_picker.get_date()
+    # Senza file i selettori non sono stati limitati al suo intervallo: valgono come "tutto lo storico"
+    file_known = get_csv_date_limits(symbol, timeframe)[0] is not None
     
     def update_status(msg):
         root.after(0, lambda: status_label.config(text=msg))
     
     def run_backtest_thread():
+        nonlocal start_date, end_date
         try:
             def update_progress(value):
                 if isinstance(value, str):
                     root.after(0, lambda: update_status(value))
                 else:
                     root.after(0, lambda: progress_bar.configure(value=value))
-            results = run_backtest(tp, sl, symbol, timeframe, commission, initial_cash, size_pct, entry_period, max_hold, trade_type, cpu_count_var.get(), use_numba_var.get(), progress_callback=update_progress)
+            filename = ensure_data_file(symbol, timeframe, update_progress)
+            start_date, end_date = clip_dates(filename, start_date, end_date, file_known)
+            if not file_known:
+                root.after(0, update_date_limits)
+            results = run_backtest(tp, sl, symbol, timeframe, commission, initial_cash, size_pct, entry_period, max_hold, trade_type, cpu_count_var.get(), use_numba_var.get(), progress_callback=update_progress, start_date=start_date, end_date=end_date)
             root.after(0, lambda: update_result(results, plot_enabled))
         except Exception as e:
             error_msg = str(e)
@@ -556,35 +486,24 @@ def update_csv_files(selected_pairs, selected_timeframes):
     def run_update():
         try:
             total_items = len(selected_pairs) * len(selected_timeframes)
-            current_item = 0
+            completed = []
             
-            for symbol in selected_pairs:
-                for timeframe in selected_timeframes:
-                    try:
-                        current_item += 1
-                        progress = (current_item / total_items) * 100
-                        update_progress(f"Processing {symbol} {timeframe} ({current_item}/{total_items})...")
-                        
-                        # Calculate start date based on timeframe
-                        days = get_days_for_timeframe(timeframe)
-                        start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-                        
-                        # Download data
-                        df = fetch_historical_klines(symbol, timeframe, start_date, progress_callback=update_progress)
-                        
-                        # Save to CSV
-                        filename = os.path.join('csv', f'{symbol.lower()}_{timeframe}.csv')
-                        df.to_csv(filename)
-                        
-                        update_progress(f"Successfully updated {filename} with {len(df)} rows")
-                        
-                    except Exception as e:
-                        update_progress(f"Error updating {symbol} {timeframe}: {str(e)}")
-                        continue
+            def on_job_progress(job, msg):
+                # Le coppie sono scaricate in parallelo: mostra l'ultimo messaggio di ogni job
+                if job.status != 'running':
+                    completed.append(job)
+                    update_progress(len(completed) / total_items * 100)
+                update_progress(f"[{job.symbol} {job.interval}] ({len(completed)}/{total_items}) {msg}")
             
-            # Update date limits for current symbol after all downloads
-            update_date_limits()
-            update_progress("All selected CSV files have been updated!")
+            # Se è selezionato 1m, gli altri timeframe sono ricavati localmente dai dati 1m
+            jobs = download_all(selected_pairs, selected_timeframes, max_workers=8, progress_callback=on_job_progress,
+                                resample_from='1m')
+            errors = [job for job in jobs if job.status == 'error']
+            
+            if errors:
+                update_progress(f"Updated {total_items - len(errors)}/{total_items} files, {len(errors)} errors")
+            else:
+                update_progress("All selected CSV files have been updated!")
             
         except Exception as e:
             update_progress(f"Error: {str(e)}")
@@ -598,21 +517,19 @@ def update_csv_thread():
     dialog = UpdateCSVDialog(root)
 
 def get_available_csv_files():
-    """Get list of available CSV files in the csv directory"""
-    available_pairs = set()
-    available_timeframes = set()
-    
-    if os.path.exists('csv'):
-        for filename in os.listdir('csv'):
-            if filename.endswith('.csv'):
-                # Extract symbol and timeframe from filename (e.g., 'btcusdt_1h.csv')
-                parts = filename[:-4].split('_')  # Remove .csv and split
-                if len(parts) == 2:
-                    symbol, timeframe = parts
-                    available_pairs.add(symbol.upper())
-                    available_timeframes.add(timeframe)
-    
-    return sorted(list(available_pairs)), sorted(list(available_timeframes))
+    """Get list of available CSV files from the csv/catalog.json metadata catalog"""
+    return list_available('csv')
+
+def update_date_limits():
+    """Limit the date pickers to the range of the selected CSV (from the catalog)"""
+    min_date, max_date = get_csv_date_limits(symbol_var.get(), timeframe_var.get())
+    if min_date is None:
+        return
+    min_date, max_date = min_date.date(), max_date.date()
+    for picker in (start_date_picker, end_date_picker):
+        picker.config(mindate=min_date, maxdate=max_date)
+    start_date_picker.set_date(min_date)
+    end_date_picker.set_date(max_date)
 
 def update_symbol_combo():
     """Update the symbol combobox with available pairs"""
@@ -706,6 +623,15 @@ trade_type_var = tk.StringVar(value="LONG")
 trade_type_combo = ttk.Combobox(input_frame, textvariable=trade_type_var, values=["LONG", "SHORT", "BOTH"])
 trade_type_combo.grid(row=9, column=1, padx=5, pady=2)
 
+# Periodo della simulazione (limitato al range del CSV selezionato)
+ttk.Label(input_frame, text="Start Date:").grid(row=10, column=0, sticky="w")
+start_date_picker = DateEntry(input_frame, date_pattern='yyyy-mm-dd')
+start_date_picker.grid(row=10, column=1, padx=5, pady=2)
+
+ttk.Label(input_frame, text="End Date:").grid(row=11, column=0, sticky="w")
+end_date_picker = DateEntry(input_frame, date_pattern='yyyy-mm-dd')
+end_date_picker.grid(row=11, column=1, padx=5, pady=2)
+
 # Checkbox for plot
 plot_var = tk.BooleanVar(value=False)
 plot_checkbox = ttk.Checkbutton(input_frame, text="Show Backtrader Plot", variable=plot_var)
@@ -749,16 +675,9 @@ update_csv_button.grid(row=2, column=0, pady=5)
 # Inizializza la label del cash con la valuta corretta
 update_cash_label()
 
-# Commento o rimuovo la funzione update_date_limits e tutti i riferimenti a start_date_picker e end_date_picker
-# def update_date_limits():
-#     ...
-#     start_date_picker.config(...)
-#     end_date_picker.config(...)
-# ...
-# E tutti i punti dove viene chiamata update_date_limits()
-
 # Update comboboxes with available CSV files
 update_symbol_combo()
 update_timeframe_combo()
+update_date_limits()
 
 root.mainloop() 
\ No newline at end of file
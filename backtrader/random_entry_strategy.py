@@ -40,6 +40,8 @@ class RandomEntryTPSL(bt.Strategy):
         ('max_hold', 30),       # Max bars in position
         ('trade_type', 'LONG'), # Tipo di trade (LONG, SHORT, BOTH)
         ('use_numba', True),
+        ('seed', None),         # Seed per la scelta long/short con BOTH (None: non riproducibile)
+        ('sides', None),        # Lato (+1/-1) per barra con BOTH, condiviso tra più run (numeri casuali comuni)
     )
 
     def __init__(self):
@@ -49,6 +51,7 @@ class RandomEntryTPSL(bt.Strategy):
         self.trade_count = 0
         self.bar_in_trade = 0
         self.position_type = None  # 'long' or 'short'
+        self.rng = random.Random(self.p.seed)
         # Exit counters
         self.exit_tp = 0
         self.exit_sl = 0
@@ -86,7 +89,7 @@ class RandomEntryTPSL(bt.Strategy):
             cash = self.broker.getvalue() * self.p.size_pct
             size = cash / price  # Usa posizioni frazionarie
             if size >= 0.001:
-                ttype = self.trade_type.upper() if hasattr(self, 'trade_type') else 'LONG'
+                ttype = getattr(self, 'trade_type', self.p.trade_type).upper()
                 if ttype == 'LONG':
                     self.order = self.buy(size=size)
                     self.position_type = 'long'
@@ -94,7 +97,11 @@ class RandomEntryTPSL(bt.Strategy):
                     self.order = self.sell(size=size)
                     self.position_type = 'short'
                 elif ttype == 'BOTH':
-                    if random.choice([True, False]):
+                    if self.p.sides is not None:
+                        go_long = self.p.sides[len(self) - 1] > 0
+                    else:
+                        go_long = self.rng.choice([True, False])
+                    if go_long:
                         self.order = self.buy(size=size)
                         self.position_type = 'long'
                     else:
@@ -0,0 +1,105 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from data_store import COLUMNS, load_arrays, build_store, read_meta, is_store_valid
+from kline_fetcher import INTERVAL_MS, get_data_filename
+
+# Timeframe scaricato da Binance da cui si derivano tutti gli altri
+BASE_TIMEFRAME = '1m'
+# Le candele settimanali Binance iniziano il lunedì (1970-01-05), non all'epoch
+BAR_OFFSET_MS = {'1w': 4 * 86_400_000}
+
+def resample_ohlcv(arrays, timeframe, source_ms=None):
+    """Aggregate OHLCV arrays into coarser `timeframe` bars (vectorized).
+
+    Bars are aligned to the epoch like Binance klines: open is the first
+    open, high/low the max/min, close the last close and volume the sum of
+    the source bars falling in each period. Periods without source bars
+    (gaps) produce no bar; a first or last period only partially covered
+    by the source history is dropped, since its values would be wrong.
+    """
+    ts = np.asarray(arrays['timestamp'])
+    bar_ms = INTERVAL_MS[timeframe]
+    offset = BAR_OFFSET_MS.get(timeframe, 0)
+    empty = {col: np.asarray(arrays[col])[:0] for col in COLUMNS}
+    if len(ts) == 0:
+        return empty
+    if source_ms is None:
+        source_ms = int(np.median(np.diff(ts))) if len(ts) > 1 else bar_ms
+    if bar_ms % source_ms:
+        raise ValueError(f"Cannot build {timeframe} bars from {source_ms} ms bars")
+
+    buckets = (ts - offset) // bar_ms * bar_ms + offset
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)]
+    out = {
+        'timestamp': buckets[starts],
+        'open': np.asarray(arrays['open'])[starts],
+        'high': np.maximum.reduceat(np.asarray(arrays['high']), starts),
+        'low': np.minimum.reduceat(np.asarray(arrays['low']), starts),
+        'close': np.asarray(arrays['close'])[ends - 1],
+        'volume': np.add.reduceat(np.asarray(arrays['volume']), starts),
+    }
+    keep = np.ones(len(starts), dtype=bool)
+    keep[0] = ts[0] == buckets[0]
+    keep[-1] &= ts[-1] + source_ms >= buckets[-1] + bar_ms
+    return {col: values[keep] for col, values in out.items()}
+
+def write_resampled_file(source_filename, filename, timeframe):
+    """Resample a stored file and save it as CSV plus columnar store"""
+    arrays = resample_ohlcv(load_arrays(source_filename), timeframe)
+    source_meta = read_meta(source_filename)
+    df = pd.DataFrame({col: arrays[col] for col in COLUMNS[1:]},
+                      index=pd.DatetimeIndex(pd.to_datetime(arrays['timestamp'], unit='ms'), name='timestamp'))
+    df.to_csv(filename)
+    # Lo store ricorda da quale file e versione dei dati è stato derivato
+    source = {'filename': source_filename, 'checksum': source_meta['checksum'], 'rows': source_meta['rows']}
+    return build_store(filename, arrays, extra_meta={'source': source})
+
+def is_derived_file(filename):
+    """True if filename does not exist yet or was built by this module"""
+    if not os.path.exists(filename):
+        return True
+    meta = read_meta(filename)
+    return meta is not None and 'source' in meta
+
+def is_derived_current(filename, source_filename):
+    meta = read_meta(filename)
+    if meta is None or 'source' not in meta or not is_store_valid(filename):
+        return False
+    load_arrays(source_filename)  # aggiorna lo store sorgente se il CSV è cambiato
+    source_meta = read_meta(source_filename)
+    return (meta['source']['checksum'] == source_meta['checksum']
+            and meta['source']['rows'] == source_meta['rows'])
+
+def ensure_resampled(symbol, timeframe, base_timeframe=BASE_TIMEFRAME):
+    """Filename of symbol/timeframe built locally from base_timeframe data.
+
+    Returns None when the base file is missing. A file downloaded from
+    Binance is never overwritten; a derived file is rebuilt when its source
+    changed.
+    """
+    filename = get_data_filename(symbol, timeframe)
+    source_filename = get_data_filename(symbol, base_timeframe)
+    if timeframe == base_timeframe or not os.path.exists(source_filename):
+        return None
+    if not is_derived_file(filename) or is_derived_current(filename, source_filename):
+        return filename
+    write_resampled_file(source_filename, filename, timeframe)
+    return filename
+
+def main():
+    parser = argparse.ArgumentParser(description="Costruisce timeframe superiori dai dati 1m locali")
+    parser.add_argument('--symbol', type=str, default='BTCUSDT', help='Trading Pair')
+    parser.add_argument('--timeframes', type=str, nargs='+', default=['5m', '15m', '1h', '4h', '1d'], help='Timeframes')
+    args = parser.parse_args()
+    for timeframe in args.timeframes:
+        filename = ensure_resampled(args.symbol, timeframe)
+        if filename is None:
+            print(f"File {get_data_filename(args.symbol, BASE_TIMEFRAME)} non trovato")
+            return
+        print(f"{filename}: {read_meta(filename)['rows']} barre")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+import numpy as np
+from data_store import CACHE_DIRNAME, data_fingerprint
+
+RESULTS_DIRNAME = 'results'
+# Da incrementare quando cambia la simulazione o il formato dei risultati: invalida la cache
+RESULT_VERSION = 1
+MAX_BYTES = 256 * 1024 * 1024
+# La scansione della cartella si ripete al più ogni EVICT_EVERY scritture, o prima se si supera max_bytes
+EVICT_EVERY = 1000
+# L'eviction scende sotto questa frazione di max_bytes, così la cache piena non scansiona a ogni scrittura
+EVICT_TO = 0.9
+
+# Cartella -> [byte stimati, scritture dall'ultima scansione], per processo
+_usage = {}
+
+def result_key(filename, args, start=None, end=None, engine='backtrader', seed=None):
+    """Hash of every parameter that changes the result, plus the identity of the data.
+
+    args is the backtest_args tuple of the CLI/GUI; use_numba and the chunk
+    size do not change the result and are left out. Returns None when the
+    run is not reproducible (BOTH without a seed), so it is never cached.
+    Dates given as date objects (GUI) hash like their YYYY-MM-DD strings (CLI).
+    """
+    tp, sl, symbol, timeframe, commission, initial_cash, size_pct, entry_period, max_hold, trade_type, _ = args
+    if trade_type.upper() == 'BOTH' and seed is None:
+        return None
+    if isinstance(seed, np.random.SeedSequence):
+        # Replica Monte Carlo: identificata da entropia e posizione nello spawn
+        seed = [seed.entropy, list(seed.spawn_key)]
+    content = {
+        'version': RESULT_VERSION,
+        'data': data_fingerprint(filename),
+        'symbol': symbol, 'timeframe': timeframe,
+        'tp': float(tp), 'sl': float(sl), 'commission': float(commission), 'initial_cash': float(initial_cash),
+        'size_pct': float(size_pct), 'entry_period': int(entry_period), 'max_hold': int(max_hold),
+        'trade_type': trade_type.upper(), 'start': start, 'end': end, 'engine': engine, 'seed': seed,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+class ResultCache:
+    """Result dicts on disk, one pickle per key, evicted least recently used first.
+
+    A hit refreshes the file mtime, so the mtime orders the entries by last
+    use. put keeps an approximate size of the folder (scanned once, then
+    grown by each write) and evicts the oldest entries, down to
+    EVICT_TO * max_bytes, when it passes max_bytes or every EVICT_EVERY
+    writes, which also counts the writes of other processes. Writes go through a temporary file and os.replace, so concurrent workers
+    never read a partial entry.
+    """
+
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def for_data(cls, filename, max_bytes=MAX_BYTES):
+        """Cache kept in the .cache folder next to the data file"""
+        return cls(os.path.join(os.path.dirname(filename), CACHE_DIRNAME, RESULTS_DIRNAME), max_bytes)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        """Cached result for key, or None"""
+        if key is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return result
+
+    def put(self, key, result):
+        if key is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        usage = _usage.get(self.directory)
+        if usage is None:
+            _usage[self.directory] = [self.evict(), 0]
+            return
+        usage[0] += len(data)
+        usage[1] += 1
+        if usage[0] > self.max_bytes or usage[1] >= EVICT_EVERY:
+            usage[:] = [self.evict(), 0]
+
+    def entries(self):
+        """(mtime, size, path) of the cached results, least recently used first"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.pkl'):
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        except OSError:
+            return []
+        return sorted(entries)
+
+    def evict(self):
+        """Remove the least recently used entries if over max_bytes; returns the remaining size"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return total
+        for _, size, path in entries:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        return total
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _usage.pop(self.directory, None)
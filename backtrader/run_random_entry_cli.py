@@ -1,18 +1,47 @@
 import argparse
 import time
+from functools import partial
 import pandas as pd
 import numpy as np
 import backtrader as bt
-from multiprocessing import Pool, cpu_count
 from random_entry_strategy import RandomEntryTPSL
+from data_store import arrays_to_dataframe
+from shared_data import get_dataset
+from resample import ensure_resampled
+from chunked_feed import ChunkedStoreData
+from fast_engine import run_fast_backtest, run_numba_backtest, make_sides
+from event_engine import run_event_backtest
+from position_book import run_book_backtest
+from monte_carlo import run_ensemble, summarize_ensemble, python_seed
+from worker_pool import WorkerPool
+from result_cache import ResultCache, result_key
+from sweep_store import SweepStore, cell_key, result_cell_key
+from data_store import data_fingerprint, get_date_limits
+from halving_search import rung_starts, successive_halving, refine, sample_candidates, rank
+from contextlib import nullcontext
 import os
+from itertools import product
 from tqdm import tqdm
 import sys
 import cProfile
 import pstats
 
+# Motori che simulano la strategia sugli array senza Cerebro (stesse chiavi del risultato)
+FAST_ENGINES = {
+    'numpy': run_fast_backtest,
+    'numba': run_numba_backtest,
+    'events': run_event_backtest,
+    # Posizioni sovrapposte: un ingresso ogni entry_period anche con posizioni aperte
+    'book': run_book_backtest,
+}
+
+# Colonne della tabella della griglia: parametri e metriche
+GRID_COLUMNS = ('tp', 'sl', 'max_hold', 'entry_period', 'pnl', 'sharpe', 'annual_return', 'max_drawdown',
+                'total_trades', 'win_rate', 'avg_trade', 'vwr', 'exit_tp', 'exit_sl', 'exit_time')
+
 def ensure_data_file(symbol, timeframe):
-    filename = os.path.join('csv', f'{symbol.lower()}_{timeframe}.csv')
+    # Timeframe mancanti (o derivati non aggiornati) si costruiscono dai dati 1m locali
+    filename = ensure_resampled(symbol, timeframe) or os.path.join('csv', f'{symbol.lower()}_{timeframe}.csv')
     if not os.path.exists(filename):
         raise FileNotFoundError(f"File {filename} non trovato. Scaricalo o generane uno.")
     return filename
@@ -29,21 +58,48 @@ class ProgressStrategy(RandomEntryTPSL):
             self.progress_bar.update(1)
         super().next()
 
-def run_single_backtest(args):
+def run_single_backtest(args, start=None, end=None, chunk_size=None, engine='backtrader', seed=None, use_cache=True):
+    """Result of one backtest, served from the result cache when the same run was already computed"""
+    cache, key = None, None
+    if use_cache:
+        filename = ensure_data_file(args[2], args[3])
+        cache = ResultCache.for_data(filename)
+        key = result_key(filename, args, start, end, engine, seed)
+        result = cache.get(key)
+        if result is not None:
+            return result
+    result = compute_single_backtest(args, start, end, chunk_size, engine, seed)
+    if cache:
+        cache.put(key, result)
+    return result
+
+def compute_single_backtest(args, start=None, end=None, chunk_size=None, engine='backtrader', seed=None):
     tp, sl, symbol, timeframe, commission, initial_cash, size_pct, entry_period, max_hold, trade_type, use_numba = args
     cerebro = bt.Cerebro()
     filename = ensure_data_file(symbol, timeframe)
-    df = pd.read_csv(filename, parse_dates=[0])
-    df.columns = ['datetime', 'open', 'high', 'low', 'close', 'volume'] + list(df.columns[6:])
-    df['datetime'] = pd.to_datetime(df['datetime'])
-    df.set_index('datetime', inplace=True)
-    start_date = df.index[0]
-    end_date = df.index[-1]
+    arrays = get_dataset(filename, start, end)
+    total_bars = len(arrays['timestamp'])
+    if total_bars == 0:
+        raise ValueError(f"Nessun dato in {filename} tra {start} e {end}")
+    start_date = pd.Timestamp(arrays['timestamp'][0], unit='ms')
+    end_date = pd.Timestamp(arrays['timestamp'][-1], unit='ms')
     duration_days = (end_date - start_date).days
     duration_years = duration_days / 365.25
-    data = bt.feeds.PandasData(dataname=df)
+    # Con un seed i lati long/short dipendono solo dalla barra: stessi numeri casuali per ogni TP/SL e motore
+    sides = make_sides(trade_type, total_bars, seed) if seed is not None else None
+    if engine in FAST_ENGINES:
+        # Stessa strategia simulata direttamente sugli array, senza Cerebro
+        result = FAST_ENGINES[engine](arrays, tp, sl, commission, initial_cash, size_pct,
+                                      entry_period, max_hold, trade_type, sides=sides)
+        result.update(start_date=start_date, end_date=end_date,
+                      duration_days=duration_days, duration_years=duration_years)
+        return result
+    if chunk_size:
+        # Storico letto a blocchi dallo store: la memoria non cresce con la lunghezza dei dati
+        data = ChunkedStoreData(filename=filename, block_size=chunk_size, start=start, end=end)
+    else:
+        data = bt.feeds.PandasData(dataname=arrays_to_dataframe(arrays))
     cerebro.adddata(data)
-    total_bars = len(df)
     with tqdm(total=total_bars, desc='Simulazione', ncols=80) as pbar:
         cerebro.addstrategy(ProgressStrategy,
                            tp=tp,
@@ -53,6 +109,8 @@ def run_single_backtest(args):
                            max_hold=max_hold,
                            trade_type=trade_type,
                            use_numba=use_numba,
+                           seed=python_seed(seed),
+                           sides=sides,
                            progress_bar=pbar,
                            total_bars=total_bars)
         cerebro.broker.setcash(initial_cash)
@@ -63,7 +121,8 @@ def run_single_backtest(args):
         cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
         cerebro.addanalyzer(bt.analyzers.VWR, _name='vwr')
         cerebro.addanalyzer(bt.analyzers.TimeReturn, _name='time_return')
-        results = cerebro.run()
+        # exactbars=1: backtrader tiene in memoria solo le barre strettamente necessarie
+        results = cerebro.run(exactbars=1 if chunk_size else 0)
     strat = results[0]
     final_value = cerebro.broker.getvalue()
     sharpe = strat.analyzers.sharpe.get_analysis()
@@ -95,24 +154,224 @@ def run_single_backtest(args):
         'duration_years': duration_years
     }
 
-def run_backtest(args, num_cpus=1):
+def run_backtest(args, start=None, end=None, chunk_size=None, engine='backtrader', seed=None, use_cache=True):
+    # Un solo backtest non si parallelizza: gira nel processo corrente (un Pool aggiungerebbe solo l'avvio dei worker)
     start_time = time.time()
-    if num_cpus == 1:
-        result = run_single_backtest(args)
-        elapsed = time.time() - start_time
-        result['elapsed'] = elapsed
-        result['num_cpus'] = 1
-        result['use_numba'] = args[-1]
-        return result
+    result = run_single_backtest(args, start=start, end=end, chunk_size=chunk_size, engine=engine, seed=seed,
+                                 use_cache=use_cache)
+    result['elapsed'] = time.time() - start_time
+    result['num_cpus'] = 1
+    result['use_numba'] = args[-1]
+    return result
+
+def param_range(values, dtype=float):
+    """Grid values from a MIN MAX N option (integers are rounded and deduplicated)"""
+    low, high, points = values
+    grid = np.linspace(low, high, max(int(points), 1))
+    if dtype is int:
+        return sorted(set(int(round(v)) for v in grid))
+    return [float(v) for v in grid]
+
+def expand_grid(backtest_args, tp_values, sl_values, max_hold_values, entry_period_values):
+    """One backtest_args tuple per (tp, sl, max_hold, entry_period) combination"""
+    tp, sl, symbol, timeframe, commission, initial_cash, size_pct, entry_period, max_hold, trade_type, use_numba = backtest_args
+    return [(t, s, symbol, timeframe, commission, initial_cash, size_pct, e, h, trade_type, use_numba)
+            for t, s, h, e in product(tp_values, sl_values, max_hold_values, entry_period_values)]
+
+def _tag_result(result, args):
+    result.update(tp=args[0], sl=args[1], entry_period=args[7], max_hold=args[8])
+    return result
+
+def _run_grid_task(backtest, args):
+    return _tag_result(backtest(args), args)
+
+def warm_params_of(args):
+    """WorkerPool warm_params (tp, sl, commission, initial_cash, size_pct, entry_period, max_hold) of a backtest_args tuple"""
+    return (args[0], args[1], args[4], args[5], args[6], args[7], args[8])
+
+def run_grid_search(args_list, num_cpus=1, shared_data=False, start=None, end=None, chunk_size=None,
+                    engine='backtrader', seed=None, rank_by='pnl', use_cache=True, store=None, sweep_key=None,
+                    pool=None, measure_overhead=False):
+    """Run every combination of args_list across num_cpus workers and return the ranked table.
+
+    With a SweepStore every finished cell is committed as it arrives and
+    cells already stored for sweep_key are not run again (resume after an
+    interruption). Combinations already in the result cache are read in
+    the parent and only the missing ones are computed. Workers come from a WorkerPool
+    (imports, Numba warm-up and shared data paid once per worker) and tasks
+    are dispatched with imap_unordered in chunks; the table is sorted by
+    `rank_by`, best first (missing values last); pass `pool` to reuse a
+    WorkerPool across calls. Also returns the timing stats, with the pool
+    ones when a pool was used (plus WorkerPool.measure_overhead if
+    `measure_overhead`).
+    """
+    backtest = partial(_run_grid_task, partial(run_single_backtest, start=start, end=end, chunk_size=chunk_size,
+                                               engine=engine, seed=seed, use_cache=use_cache))
+    results = []
+    todo = list(args_list)
+    stats = {'resumed': 0}
+    if store is not None:
+        done = store.finished(sweep_key)
+        results = [done[cell_key(args)] for args in args_list if cell_key(args) in done]
+        todo = [args for args in args_list if cell_key(args) not in done]
+        stats['resumed'] = len(results)
+
+    def finish(result):
+        results.append(result)
+        if store is not None:
+            store.add(sweep_key, result)
+
+    if use_cache:
+        filename = ensure_data_file(args_list[0][2], args_list[0][3])
+        cache = ResultCache.for_data(filename)
+        missing = []
+        for args in todo:
+            result = cache.get(result_key(filename, args, start, end, engine, seed))
+            if result is None:
+                missing.append(args)
+            else:
+                finish(_tag_result(result, args))
+        todo = missing
+    stats.update(cached=len(results) - stats['resumed'], computed=len(todo))
+    with tqdm(total=len(args_list), initial=len(results), desc='Griglia', ncols=80) as pbar:
+        def on_result(result):
+            finish(result)
+            pbar.update(1)
+
+        if (num_cpus == 1 and pool is None) or len(todo) <= 1:
+            for args in todo:
+                on_result(backtest(args))
+        elif pool is not None:
+            pool.map(backtest, todo, callback=on_result)
+            stats.update(pool.last_stats)
+        else:
+            # Con shared_data il parent carica i dati una volta e i worker si agganciano alla memoria condivisa
+            filenames = [ensure_data_file(todo[0][2], todo[0][3])] if shared_data else []
+            with WorkerPool(num_cpus, filenames=filenames, warm_params=warm_params_of(todo[0]), engine=engine) as pool:
+                pool.map(backtest, todo, callback=on_result)
+                stats.update(pool.last_stats, startup_seconds=pool.startup_seconds)
+                if measure_overhead:
+                    stats.update(pool.measure_overhead())
+    table = pd.DataFrame(results, columns=list(GRID_COLUMNS))
+    table['sharpe'] = table['sharpe'].astype(float)  # None (std nulla) -> NaN
+    table = table.sort_values(rank_by, ascending=rank_by == 'max_drawdown', na_position='last')
+    return table.reset_index(drop=True), stats
+
+def run_monte_carlo(args, backtest_args, chunk_size=None):
+    """Ensemble of seeded replicas: prints mean, std and quantiles of the main metrics"""
+    start_time = time.time()
+    backtest = partial(run_single_backtest, backtest_args, start=args.start, end=args.end,
+                       chunk_size=chunk_size, engine=args.engine, use_cache=not args.no_cache)
+    results = run_ensemble(backtest, replicas=args.replicas, seed=args.seed, num_cpus=args.num_cpus)
+    elapsed = time.time() - start_time
+    print("\n=== ENSEMBLE MONTE CARLO ===")
+    print(f"Trading Pair: {args.symbol}  Timeframe: {args.timeframe}  Trade Type: {args.trade_type}")
+    print(f"Repliche: {args.replicas}  Seed: {args.seed}  Motore: {args.engine}  CPU usate: {args.num_cpus}")
+    print(f"Tempo di calcolo: {elapsed:.2f} secondi")
+    print("------------------------------")
+    print(summarize_ensemble(results).round(3).to_string())
+
+def run_grid(args, backtest_args, chunk_size=None):
+    """Parameter grid from the *-range options: prints the best combinations and saves the ranked table"""
+    args_list = expand_grid(
+        backtest_args,
+        param_range(args.tp_range) if args.tp_range else [args.tp],
+        param_range(args.sl_range) if args.sl_range else [args.sl],
+        param_range(args.max_hold_range, int) if args.max_hold_range else [args.max_hold],
+        param_range(args.entry_period_range, int) if args.entry_period_range else [args.entry_period])
+    store, sweep_key = None, None
+    if args.sweep_db:
+        # Stessa specifica (parametri fissi, griglia e dati) -> stesso sweep: le celle già salvate si saltano
+        spec = dict(zip(('symbol', 'timeframe', 'commission', 'initial_cash', 'size_pct', 'trade_type'),
+                        backtest_args[2:6] + backtest_args[6:7] + backtest_args[9:10]),
+                    start=args.start, end=args.end, engine=args.engine, seed=args.seed,
+                    data=data_fingerprint(ensure_data_file(args.symbol, args.timeframe)),
+                    cells=sorted(cell_key(a) for a in args_list))
+        store = SweepStore(args.sweep_db)
+        sweep_key = store.begin(spec)
+    start_time = time.time()
+    try:
+        table, stats = run_grid_search(args_list, num_cpus=args.num_cpus, shared_data=args.shared_data,
+                                       start=args.start, end=args.end, chunk_size=chunk_size, engine=args.engine,
+                                       seed=args.seed, rank_by=args.rank_by, use_cache=not args.no_cache,
+                                       store=store, sweep_key=sweep_key, measure_overhead=args.measure_overhead)
+    finally:
+        if store is not None:
+            store.close()
+    elapsed = time.time() - start_time
+    table.to_csv(args.output, index=False)
+    print("\n=== GRIGLIA DI PARAMETRI ===")
+    print(f"Trading Pair: {args.symbol}  Timeframe: {args.timeframe}  Trade Type: {args.trade_type}")
+    print(f"Combinazioni: {len(args_list)}  Motore: {args.engine}  CPU usate: {args.num_cpus}")
+    print(f"Tempo di calcolo: {elapsed:.2f} secondi ({elapsed / len(args_list):.3f} s per combinazione)")
+    if sweep_key:
+        print(f"Sweep {sweep_key} in {args.sweep_db}: {stats['resumed']} celle riprese")
+    print(f"Dalla cache: {stats['cached']}  Calcolate: {stats['computed']}")
+    if 'startup_seconds' in stats:
+        print(f"Pool: avvio e warm-up {stats['startup_seconds']:.2f} s, overhead {stats['overhead_ms_per_task']:.3f} ms per task")
+    if 'batched_ms_per_task' in stats:
+        print(f"Overhead del Pool: task vuoti {stats['batched_ms_per_task']:.4f} ms, "
+              f"round trip {stats['round_trip_ms']:.3f} ms")
+    print(f"Ordinate per: {args.rank_by}  Tabella completa: {args.output}")
+    print("------------------------------")
+    print(table.head(args.top).round(4).to_string())
+
+def run_halving(args, backtest_args, chunk_size=None):
+    """Adaptive TP/SL/max_hold search: successive halving on growing history slices, then local refinement"""
+    tp_range = args.tp_range or [args.tp, args.tp, 1]
+    sl_range = args.sl_range or [args.sl, args.sl, 1]
+    hold_range = args.max_hold_range or [args.max_hold, args.max_hold, 1]
+    if args.samples:
+        candidates = sample_candidates(backtest_args, tp_range[:2], sl_range[:2], hold_range[:2], args.samples, args.seed)
     else:
-        args_list = [args]
-        with Pool(num_cpus) as pool:
-            results = pool.map(run_single_backtest, args_list)
-        elapsed = time.time() - start_time
-        results[0]['elapsed'] = elapsed
-        results[0]['num_cpus'] = num_cpus
-        results[0]['use_numba'] = args[-1]
-        return results[0]
+        candidates = expand_grid(
+            backtest_args, param_range(tp_range), param_range(sl_range), param_range(hold_range, int),
+            param_range(args.entry_period_range, int) if args.entry_period_range else [args.entry_period])
+    filename = ensure_data_file(args.symbol, args.timeframe)
+    first, last = get_date_limits(filename)
+    starts = rung_starts(args.start or first, args.end or last, args.rungs, args.eta)
+    full_cost = [0.0]
+    span = (pd.Timestamp(args.end or last) - pd.Timestamp(starts[-1])).days + 1
+
+    def evaluate(args_list, start, end, pool=None):
+        # Costo in backtest equivalenti sull'intero storico (proporzionale ai giorni simulati)
+        full_cost[0] += len(args_list) * ((pd.Timestamp(args.end or last) - pd.Timestamp(start)).days + 1) / span
+        table, _ = run_grid_search(args_list, num_cpus=args.num_cpus, shared_data=args.shared_data, start=start,
+                                   end=end, chunk_size=chunk_size, engine=args.engine, seed=args.seed,
+                                   rank_by=args.rank_by, use_cache=not args.no_cache, pool=pool)
+        return table
+
+    start_time = time.time()
+    filenames = [filename] if args.shared_data else []
+    pool = (WorkerPool(args.num_cpus, filenames=filenames, warm_params=warm_params_of(candidates[0]), engine=args.engine)
+            if args.num_cpus > 1 else nullcontext())
+    with pool as pool:
+        run = partial(evaluate, pool=pool)
+        tables = successive_halving(run, candidates, starts, args.end, args.eta, args.rank_by)
+        final = tables[-1]
+        seen = {result_cell_key(row) for table in tables for _, row in table.iterrows()}
+        best = next(c for c in candidates if cell_key(c) == result_cell_key(final.iloc[0]))
+        # Il raffinamento resta negli intervalli dei candidati
+        bounds = (tuple(tp_range[:2]), tuple(sl_range[:2]), tuple(hold_range[:2]))
+        tables += refine(run, best, final.iloc[0][args.rank_by], starts[-1], args.end, rounds=args.refine,
+                         rank_by=args.rank_by, seen=seen, bounds=bounds)
+    elapsed = time.time() - start_time
+    # Classifica finale: celle valutate sull'intero storico (ultimo livello e raffinamento)
+    full = pd.concat([final.drop(columns=['rung', 'start'])] + tables[len(starts):], ignore_index=True)
+    full = rank(full, args.rank_by)
+    full.to_csv(args.output, index=False)
+    runs = sum(len(t) for t in tables)
+    print("\n=== RICERCA ADATTIVA (SUCCESSIVE HALVING) ===")
+    print(f"Trading Pair: {args.symbol}  Timeframe: {args.timeframe}  Trade Type: {args.trade_type}")
+    print(f"Candidati iniziali: {len(candidates)}  eta: {args.eta}  Livelli: {', '.join(starts)} → {args.end or last.date()}")
+    for table in tables[:len(starts)]:
+        print(f"  livello {table['rung'].iloc[0]}: {len(table)} candidati da {table['start'].iloc[0]}")
+    print(f"Raffinamento locale: {sum(len(t) for t in tables[len(starts):])} celle in {args.refine} round")
+    print(f"Backtest eseguiti: {runs} ({full_cost[0]:.1f} equivalenti sull'intero storico, "
+          f"senza halving: {len(candidates)})")
+    print(f"Tempo di calcolo: {elapsed:.2f} secondi  Ordinate per: {args.rank_by}  Tabella: {args.output}")
+    print("------------------------------")
+    print(full.head(args.top).round(4).to_string())
 
 def main():
     parser = argparse.ArgumentParser(description="Random Entry Strategy CLI")
@@ -127,9 +386,48 @@ def main():
     parser.add_argument('--max_hold', type=int, default=3000, help='Max Hold (bars)')
     parser.add_argument('--trade_type', type=str, default='LONG', choices=['LONG', 'SHORT', 'BOTH'], help='Trade Type')
     parser.add_argument('--num_cpus', type=int, default=1, help='Numero di CPU da usare')
-    parser.add_argument('--use_numba', action='store_true', help='Abilita Numba (compilazione veloce)')
+    parser.add_argument('--use_numba', action='store_true', help='Abilita Numba: kernel compilato (equivale a --engine numba)')
+    parser.add_argument('--start', type=str, default=None, help='Data iniziale (YYYY-MM-DD)')
+    parser.add_argument('--end', type=str, default=None, help='Data finale inclusa (YYYY-MM-DD)')
+    parser.add_argument('--chunked', action='store_true', help='Legge lo storico a blocchi (memoria costante)')
+    parser.add_argument('--chunk_size', type=int, default=100_000, help='Barre per blocco in modalità --chunked')
+    parser.add_argument('--shared_data', action='store_true', help='Carica i dati una volta in memoria condivisa per i worker')
+    parser.add_argument('--engine', type=str, default=None, choices=['backtrader', *FAST_ENGINES],
+                        help='Motore di simulazione (default backtrader; numpy/numba/events: array senza Cerebro, '
+                             'book: posizioni sovrapposte)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed per la scelta long/short (risultati riproducibili)')
+    parser.add_argument('--replicas', type=int, default=1, help='Repliche Monte Carlo con seed indipendenti (ensemble)')
+    parser.add_argument('--tp-range', type=float, nargs=3, default=None, metavar=('MIN', 'MAX', 'N'),
+                        help='Griglia di Take Profit: minimo, massimo, numero di punti')
+    parser.add_argument('--sl-range', type=float, nargs=3, default=None, metavar=('MIN', 'MAX', 'N'),
+                        help='Griglia di Stop Loss: minimo, massimo, numero di punti')
+    parser.add_argument('--max-hold-range', type=float, nargs=3, default=None, metavar=('MIN', 'MAX', 'N'),
+                        help='Griglia di Max Hold (barre): minimo, massimo, numero di punti')
+    parser.add_argument('--entry-period-range', type=float, nargs=3, default=None, metavar=('MIN', 'MAX', 'N'),
+                        help='Griglia di Entry Period (barre): minimo, massimo, numero di punti')
+    parser.add_argument('--rank_by', type=str, default='pnl', choices=GRID_COLUMNS[4:],
+                        help='Metrica per ordinare la tabella della griglia')
+    parser.add_argument('--top', type=int, default=20, help='Combinazioni migliori stampate')
+    parser.add_argument('--output', type=str, default='random_entry_grid_search.csv', help='CSV della tabella della griglia')
+    parser.add_argument('--search', type=str, default='grid', choices=['grid', 'halving'],
+                        help='grid: tutte le combinazioni, halving: successive halving su storici crescenti')
+    parser.add_argument('--eta', type=int, default=3, help='Halving: frazione di candidati tenuti per livello (1/eta)')
+    parser.add_argument('--rungs', type=int, default=3, help="Halving: livelli (l'ultimo usa tutto lo storico)")
+    parser.add_argument('--samples', type=int, default=None,
+                        help='Halving: candidati estratti a caso (log-uniforme) nei range invece della griglia')
+    parser.add_argument('--refine', type=int, default=2, help='Halving: round di raffinamento locale attorno al migliore')
+    parser.add_argument('--sweep_db', type=str, default=None,
+                        help='SQLite dove salvare ogni cella della griglia appena finita (ripresa dopo interruzione)')
+    parser.add_argument('--measure_overhead', action='store_true',
+                        help='Misura il costo del Pool con task vuoti dopo la griglia parallela')
+    parser.add_argument('--no_cache', action='store_true', help='Ricalcola senza usare la cache dei risultati')
     parser.add_argument('--profile', action='store_true', help='Abilita profilazione cProfile')
     args = parser.parse_args()
+    # --use_numba sceglie il motore numba solo se --engine non è indicato o coincide
+    if args.use_numba and args.engine not in (None, 'numba'):
+        parser.error(f"--use_numba equivale a --engine numba: incompatibile con --engine {args.engine}")
+    if args.engine is None:
+        args.engine = 'numba' if args.use_numba else 'backtrader'
 
     backtest_args = (
         args.tp,
@@ -144,7 +442,18 @@ def main():
         args.trade_type,
         args.use_numba
     )
-    results = run_backtest(backtest_args, num_cpus=args.num_cpus)
+    chunk_size = args.chunk_size if args.chunked else None
+    if args.replicas > 1:
+        run_monte_carlo(args, backtest_args, chunk_size)
+        return
+    if args.search == 'halving':
+        run_halving(args, backtest_args, chunk_size)
+        return
+    if any(r is not None for r in (args.tp_range, args.sl_range, args.max_hold_range, args.entry_period_range)):
+        run_grid(args, backtest_args, chunk_size)
+        return
+    results = run_backtest(backtest_args, start=args.start, end=args.end, chunk_size=chunk_size,
+                           engine=args.engine, seed=args.seed, use_cache=not args.no_cache)
 
     print("\n=== RISULTATI SIMULAZIONE ===")
     print(f"Trading Pair: {args.symbol}")
@@ -155,11 +464,11 @@ def main():
     print(f"Commissione: {args.commission*100:.2f}%  Capitale iniziale: {args.initial_cash}")
     print(f"Posizione: {args.size_pct*100:.2f}%  Entry Period: {args.entry_period}  Max Hold: {args.max_hold}")
     print(f"Trade Type: {args.trade_type}")
-    print(f"CPU usate: {results['num_cpus']}  Numba: {'Sì' if results['use_numba'] else 'No'}")
+    print(f"CPU usate: {results['num_cpus']}  Numba: {'Sì' if results['use_numba'] else 'No'}  Motore: {args.engine}")
     print(f"Tempo di calcolo: {results['elapsed']:.2f} secondi")
     print("------------------------------")
     print(f"PnL finale: {results['pnl']:.2f}%")
-    print(f"Sharpe Ratio: {results['sharpe']:.2f}")
+    print(f"Sharpe Ratio: {results['sharpe']:.2f}" if results['sharpe'] is not None else "Sharpe Ratio: N/A")
     print(f"Annual Return: {results['annual_return']:.2f}%")
     print(f"Max Drawdown: {results['max_drawdown']:.2f}%")
     print(f"Total Trades: {results['total_trades']}")
@@ -0,0 +1,61 @@
+import numpy as np
+from multiprocessing import shared_memory
+from data_store import COLUMNS, DTYPES, load_arrays, slice_arrays
+
+# Dataset agganciati nel processo corrente (worker del Pool), indicizzati per filename
+_attached = {}
+
+class SharedDataset:
+    """OHLCV arrays of one data file copied once into a shared memory block.
+
+    The parent process creates it, passes ``spec`` to the Pool initializer and
+    the workers attach to the same memory without copying or parsing.
+    """
+
+    def __init__(self, filename, arrays=None):
+        if arrays is None:
+            arrays = load_arrays(filename)
+        rows = len(arrays['timestamp'])
+        offsets = {}
+        size = 0
+        for col in COLUMNS:
+            offsets[col] = size
+            size += rows * np.dtype(DTYPES[col]).itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for col in COLUMNS:
+            view = np.ndarray((rows,), dtype=DTYPES[col], buffer=self.shm.buf, offset=offsets[col])
+            view[:] = arrays[col]
+        self.spec = {'filename': filename, 'name': self.shm.name, 'rows': rows, 'offsets': offsets}
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def attach_dataset(spec):
+    """Return read-only array views over a dataset created by SharedDataset"""
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    arrays = {}
+    for col in COLUMNS:
+        view = np.ndarray((spec['rows'],), dtype=DTYPES[col], buffer=shm.buf, offset=spec['offsets'][col])
+        view.flags.writeable = False
+        arrays[col] = view
+    # Il riferimento a shm va tenuto vivo finché si usano le viste
+    _attached[spec['filename']] = (shm, arrays)
+    return arrays
+
+def init_worker(*specs):
+    """Pool initializer: attach every shared dataset once per worker"""
+    for spec in specs:
+        attach_dataset(spec)
+
+def get_dataset(filename, start=None, end=None):
+    """Arrays for filename: shared memory if attached, otherwise the on-disk store"""
+    if filename in _attached:
+        return slice_arrays(_attached[filename][1], start, end)
+    return load_arrays(filename, start, end)
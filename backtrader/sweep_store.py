@@ -0,0 +1,98 @@
+import json
+import time
+import hashlib
+import sqlite3
+import pandas as pd
+
+# Parametri della cella e metriche salvate, nell'ordine delle colonne della tabella cells
+CELL_PARAMS = ('tp', 'sl', 'max_hold', 'entry_period')
+CELL_METRICS = ('pnl', 'sharpe', 'annual_return', 'max_drawdown', 'total_trades', 'won_trades', 'lost_trades',
+                'win_rate', 'avg_trade', 'vwr', 'exit_tp', 'exit_sl', 'exit_time')
+# Conteggi: INTEGER nella tabella e int nei risultati ripresi, come quelli appena calcolati
+CELL_COUNTS = ('total_trades', 'won_trades', 'lost_trades', 'exit_tp', 'exit_sl', 'exit_time')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sweeps (
+    sweep_id TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cells (
+    sweep_id TEXT NOT NULL REFERENCES sweeps(sweep_id),
+    {', '.join(f'{name} REAL NOT NULL' for name in CELL_PARAMS)},
+    {', '.join(f"{name} {'INTEGER' if name in CELL_COUNTS else 'REAL'}" for name in CELL_METRICS)},
+    finished REAL NOT NULL,
+    PRIMARY KEY (sweep_id, {', '.join(CELL_PARAMS)})
+);
+"""
+
+def sweep_id(spec):
+    """Stable id of a sweep spec (a JSON-serializable dict)"""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _value(value):
+    # Scalari NumPy -> tipi Python per sqlite3
+    return value.item() if hasattr(value, 'item') else value
+
+class SweepStore:
+    """SQLite file holding the finished cells of one or more sweeps.
+
+    Each cell is committed as soon as it is added, so an interrupted sweep
+    keeps everything finished so far; WAL mode lets other processes (or a
+    notebook) query the cells table while the sweep is still writing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def begin(self, spec):
+        """Register the sweep (once) and return its id"""
+        key = sweep_id(spec)
+        with self.conn:
+            self.conn.execute('INSERT OR IGNORE INTO sweeps VALUES (?, ?, ?)',
+                              (key, json.dumps(spec, sort_keys=True, default=str), time.time()))
+        return key
+
+    def finished(self, key):
+        """Finished cells of a sweep as {(tp, sl, max_hold, entry_period): result dict}"""
+        columns = CELL_PARAMS + CELL_METRICS
+        rows = self.conn.execute(f"SELECT {', '.join(columns)} FROM cells WHERE sweep_id = ?", (key,))
+        cells = {}
+        for row in rows:
+            result = dict(zip(columns, row))
+            for name in ('max_hold', 'entry_period') + CELL_COUNTS:
+                if result[name] is not None:
+                    result[name] = int(result[name])
+            cells[result_cell_key(result)] = result
+        return cells
+
+    def add(self, key, result):
+        """Store one finished cell (result dict with the cell parameters) and commit"""
+        values = [key] + [_value(result.get(name)) for name in CELL_PARAMS + CELL_METRICS] + [time.time()]
+        with self.conn:
+            self.conn.execute(f"INSERT OR REPLACE INTO cells VALUES ({', '.join('?' * len(values))})", values)
+
+    def table(self, key):
+        """Cells of a sweep as a DataFrame (also while the sweep is running)"""
+        return pd.read_sql_query('SELECT * FROM cells WHERE sweep_id = ?', self.conn, params=(key,))
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def cell_key(args):
+    """(tp, sl, max_hold, entry_period) of a backtest_args tuple, as stored in the cells table"""
+    return (float(args[0]), float(args[1]), int(args[8]), int(args[7]))
+
+def result_cell_key(result):
+    """Same key as cell_key, from a result dict or table row with the cell parameters"""
+    return (float(result['tp']), float(result['sl']), int(result['max_hold']), int(result['entry_period']))
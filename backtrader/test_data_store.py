@@ -0,0 +1,34 @@
+import json
+import shutil
+from multiprocessing import Pool
+from binance_stub import StubClient
+from data_store import get_catalog, get_catalog_path, list_available, read_meta, update_catalog
+from kline_fetcher import to_ms, update_kline_file
+
+def make_csv(data_dir, name='btcusdt_1h.csv'):
+    filename = str(data_dir / name)
+    update_kline_file('BTCUSDT', '1h', filename=filename, client=StubClient(now_ms=to_ms('2021-03-10')), days=2)
+    return filename
+
+def test_catalog_follows_directory(tmp_path):
+    filename = make_csv(tmp_path)
+    assert list_available(str(tmp_path)) == (['BTCUSDT'], ['1h'])
+    # File copiati o cancellati a mano, senza passare dal downloader
+    shutil.copy(filename, tmp_path / 'ethusdt_1h.csv')
+    assert list_available(str(tmp_path)) == (['BTCUSDT', 'ETHUSDT'], ['1h'])
+    (tmp_path / 'btcusdt_1h.csv').unlink()
+    assert list_available(str(tmp_path)) == (['ETHUSDT'], ['1h'])
+    assert get_catalog(str(tmp_path))['ethusdt_1h.csv']['rows'] == 48
+
+def _register_many(args):
+    filename, worker = args
+    meta = read_meta(filename)
+    for k in range(25):
+        update_catalog(filename.replace('btcusdt', f'w{worker}x{k}'), meta)
+
+def test_concurrent_catalog_updates(tmp_path):
+    filename = make_csv(tmp_path)
+    with Pool(4) as pool:
+        pool.map(_register_many, [(filename, worker) for worker in range(4)])
+    with open(get_catalog_path(str(tmp_path))) as f:
+        assert len(json.load(f)) == 1 + 4 * 25
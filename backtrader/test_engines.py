@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from coarse_scanner import CoarseToFineScanner
+from event_engine import run_event_backtest
+from fast_engine import run_fast_backtest, run_numba_backtest, make_sides
+from first_passage import FirstPassageIndex
+from grid_engine import evaluate_grid
+from outcome_table import SIDES, build_outcome_table, run_table_backtest
+from position_book import run_book_backtest
+from worker_pool import synthetic_arrays
+
+ARRAYS = synthetic_arrays(rows=20_000, seed=1)
+# Barre da 4h (~9 anni): Sharpe annuale e rendimenti annui hanno abbastanza anni da confrontare
+ARRAYS['timestamp'] = np.arange(20_000, dtype=np.int64) * 4 * 3_600_000
+# tp, sl, commission, initial_cash, size_pct, entry_period, max_hold
+PARAMS = [
+    (0.005, 0.004, 0.0005, 100000.0, 0.1, 10, 60),
+    (0.002, 0.01, 0.001, 100000.0, 0.5, 3, 300),
+    (0.01, 0.01, 0.0005, 100000.0, 0.9, 200, 100),
+]
+TRADE_TYPES = ['LONG', 'SHORT', 'BOTH']
+GRID_METRICS = ('pnl', 'win_rate', 'total_trades', 'won_trades', 'lost_trades', 'avg_trade',
+                'exit_tp', 'exit_sl', 'exit_time')
+
+def reference(params, trade_type):
+    sides = make_sides(trade_type, len(ARRAYS['close']), 7)
+    return sides, run_fast_backtest(ARRAYS, *params, trade_type, sides=sides)
+
+def assert_same(result, expected, keys=None):
+    for key in keys or expected:
+        if expected[key] is None:
+            assert result[key] is None, key
+        else:
+            assert result[key] == pytest.approx(expected[key], rel=1e-9, abs=1e-9), key
+
+@pytest.mark.parametrize('params', PARAMS)
+@pytest.mark.parametrize('trade_type', TRADE_TYPES)
+def test_engines_match_reference(params, trade_type):
+    sides, expected = reference(params, trade_type)
+    assert expected['total_trades'] > 10
+    assert_same(run_numba_backtest(ARRAYS, *params, trade_type, sides=sides), expected)
+    assert_same(run_event_backtest(ARRAYS, *params, trade_type, sides=sides), expected)
+    scanner = CoarseToFineScanner(ARRAYS['close'], block_size=16)
+    assert_same(run_fast_backtest(ARRAYS, *params, trade_type, index=scanner, sides=sides), expected)
+    tp, sl, commission, initial_cash, size_pct, entry_period, max_hold = params
+    for index in (None, scanner):
+        outcomes = {side: build_outcome_table(ARRAYS, tp, sl, max_hold, side, index) for side in SIDES[trade_type]}
+        assert_same(run_table_backtest(ARRAYS, outcomes, commission, initial_cash, size_pct, entry_period,
+                                       trade_type, sides=sides), expected)
+
+@pytest.mark.parametrize('trade_type', TRADE_TYPES)
+def test_book_without_overlap(trade_type):
+    # Con entry_period > max_hold + 1 le posizioni non si sovrappongono mai
+    params = PARAMS[2]
+    sides, expected = reference(params, trade_type)
+    assert_same(run_book_backtest(ARRAYS, *params, trade_type, sides=sides), expected)
+
+@pytest.mark.parametrize('params', PARAMS)
+@pytest.mark.parametrize('trade_type', TRADE_TYPES)
+def test_grid_cells_match_reference(params, trade_type):
+    tp_values, sl_values = [0.002, 0.005, 0.01], [0.01, 0.004]
+    commission, initial_cash, size_pct, entry_period, max_hold = params[2:]
+    sides = make_sides(trade_type, len(ARRAYS['close']), 7)
+    grid = evaluate_grid(ARRAYS, tp_values, sl_values, commission, initial_cash, size_pct, entry_period, max_hold,
+                         trade_type, sides=sides)
+    for i, tp in enumerate(tp_values):
+        for j, sl in enumerate(sl_values):
+            expected = run_fast_backtest(ARRAYS, tp, sl, *params[2:], trade_type, sides=sides)
+            assert_same({key: grid[key][i, j] for key in GRID_METRICS}, expected, GRID_METRICS)
+
+def brute_force_passage(high, low, start, stop, upper, lower):
+    for j in range(start, min(stop, len(high))):
+        if high[j] >= upper or low[j] <= lower:
+            return j
+    return -1
+
+@pytest.mark.parametrize('n', [1, 2, 3, 7, 64, 100, 1000])
+def test_first_passage_brute_force(n):
+    rng = np.random.default_rng(n)
+    close = np.cumsum(rng.normal(0, 1, n))
+    high, low = close + rng.uniform(0, 1, n), close - rng.uniform(0, 1, n)
+    index, close_index = FirstPassageIndex(high, low), FirstPassageIndex(close)
+    starts = rng.integers(0, n + 1, 300)
+    stops = starts + rng.integers(0, n + 1, 300)
+    uppers = rng.uniform(close.min(), close.max() + 2, 300)
+    lowers = uppers - rng.uniform(0, 10, 300)
+    expected = [brute_force_passage(high, low, *q) for q in zip(starts, stops, uppers, lowers)]
+    assert index.first_passages(starts, stops, uppers, lowers).tolist() == expected
+    assert [index.first_passage(*q) for q in zip(starts, stops, uppers, lowers)] == expected
+    expected = [brute_force_passage(close, close, *q) for q in zip(starts, stops, uppers, lowers)]
+    assert close_index.first_passages(starts, stops, uppers, lowers).tolist() == expected
+    scanner = CoarseToFineScanner(close, block_size=8)
+    assert scanner.first_passages(starts, stops, uppers, lowers).tolist() == expected
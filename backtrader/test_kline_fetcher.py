@@ -0,0 +1,66 @@
+import pytest
+from binance_stub import StubClient
+from data_store import load_arrays
+from kline_fetcher import INTERVAL_MS, to_ms, update_kline_file, read_last_timestamp, check_seam
+
+HOUR = INTERVAL_MS['1h']
+NOW = to_ms('2021-03-10 12:30')
+
+def test_fresh_download(tmp_path):
+    filename = str(tmp_path / 'btcusdt_1h.csv')
+    rows = update_kline_file('BTCUSDT', '1h', filename=filename, client=StubClient(now_ms=NOW), days=3)
+    # Da mezzanotte UTC di 3 giorni fa all'ultima candela chiusa (11:00-12:00)
+    assert rows == 3 * 24 + 12
+    assert read_last_timestamp(filename) == to_ms('2021-03-10 11:00')
+    ts = load_arrays(filename)['timestamp']
+    assert ts[0] == to_ms('2021-03-07') and len(ts) == rows
+
+def test_incremental_append(tmp_path):
+    filename = str(tmp_path / 'btcusdt_1h.csv')
+    update_kline_file('BTCUSDT', '1h', filename=filename, client=StubClient(now_ms=NOW), days=1)
+    client = StubClient(now_ms=NOW + 5 * HOUR)
+    assert update_kline_file('BTCUSDT', '1h', filename=filename, client=client) == 5
+    assert update_kline_file('BTCUSDT', '1h', filename=filename, client=client) == 0
+    ts = load_arrays(filename)['timestamp']
+    assert (ts[1:] - ts[:-1] == HOUR).all()
+    # Stesse righe di un download unico fino allo stesso istante
+    single = str(tmp_path / 'single_1h.csv')
+    update_kline_file('BTCUSDT', '1h', filename=single, client=client, days=1, now=NOW + 5 * HOUR)
+    assert open(single).read() == open(filename).read()
+
+def test_seam_gap():
+    client = StubClient(now_ms=NOW)
+    last_ts = to_ms('2021-03-10 00:00')
+    page = [client.make_kline('BTCUSDT', '1h', last_ts + k * HOUR) for k in range(-1, 6)]
+    new, missing = check_seam(last_ts, page, '1h')
+    assert [k[0] for k in new] == [last_ts + k * HOUR for k in range(1, 6)] and missing == 0
+    new, missing = check_seam(last_ts, page[4:], '1h')
+    assert missing == 2
+    with pytest.raises(ValueError):
+        check_seam(last_ts, page[3:] + page[2:3], '1h')
+
+def test_truncated_last_line(tmp_path):
+    filename = str(tmp_path / 'btcusdt_1h.csv')
+    update_kline_file('BTCUSDT', '1h', filename=filename, client=StubClient(now_ms=NOW), days=1)
+    last_ts = read_last_timestamp(filename)
+    with open(filename, 'a') as f:
+        f.write('2021-03-10 12:00:00,101.2')
+    # Riga scritta a metà (download interrotto): ignorata, il download riprende dall'ultima completa
+    assert read_last_timestamp(filename) == last_ts
+    client = StubClient(now_ms=NOW + 2 * HOUR)
+    assert update_kline_file('BTCUSDT', '1h', filename=filename, client=client) == 2
+    single = str(tmp_path / 'single_1h.csv')
+    update_kline_file('BTCUSDT', '1h', filename=single, client=client, days=1)
+    assert open(single).read() == open(filename).read()
+    assert len(load_arrays(filename)['timestamp']) == len(load_arrays(single)['timestamp'])
+
+def test_header_only(tmp_path):
+    filename = tmp_path / 'btcusdt_1h.csv'
+    filename.write_text('timestamp,open,high,low,close,volume\n')
+    assert read_last_timestamp(str(filename)) is None
+
+def test_scheduled_download_uses_client_clock(tmp_path, monkeypatch):
+    from download_scheduler import download_all
+    monkeypatch.chdir(tmp_path)
+    jobs = download_all(['BTCUSDT'], ['1h'], client_factory=lambda: StubClient(now_ms=NOW), max_workers=1, days=3)
+    assert jobs[0].status == 'done' and jobs[0].rows == 3 * 24 + 12
@@ -0,0 +1,183 @@
+import os
+import time
+import numpy as np
+from multiprocessing import Pool
+from shared_data import SharedDataset, init_worker
+
+# Parametri di default della CLI: il warm-up compila le stesse specializzazioni Numba (tipi degli scalari)
+WARM_PARAMS = (0.01, 0.01, 0.0005, 100000.0, 0.1, 10, 3000)
+
+def synthetic_arrays(rows=2880, seed=0):
+    """Small random-walk OHLCV arrays (two days of 1m bars) used to warm the kernels"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, rows)))
+    open_ = np.r_[close[0], close[:-1]]
+    return {
+        'timestamp': np.arange(rows, dtype=np.int64) * 60_000,
+        'open': open_,
+        'high': np.maximum(open_, close) * 1.0005,
+        'low': np.minimum(open_, close) * 0.9995,
+        'close': close,
+        'volume': np.ones(rows),
+    }
+
+def _warm_backtrader(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold):
+    import backtrader  # noqa: F401 (import pagato una volta per worker)
+    import pandas  # noqa: F401
+    from random_entry_strategy import calculate_exit_prices_numba
+    calculate_exit_prices_numba(100.0, tp, sl, 'long')
+
+def _warm_numpy(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold):
+    from fast_engine import run_fast_backtest
+    run_fast_backtest(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold, 'BOTH', rng=0)
+
+def _warm_numba(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold):
+    from fast_engine import run_numba_backtest
+    run_numba_backtest(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold, 'BOTH', rng=0)
+
+def _warm_events(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold):
+    from event_engine import run_event_backtest
+    run_event_backtest(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold, 'BOTH', rng=0)
+
+def _warm_book(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold):
+    from position_book import run_book_backtest
+    run_book_backtest(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold, 'BOTH', rng=0)
+
+def _warm_table(arrays, tp, sl, commission, initial_cash, size_pct, entry_period, max_hold):
+    from outcome_table import build_outcome_table, run_table_backtest
+    outcomes = {side: build_outcome_table(arrays, tp, sl, max_hold, side) for side in (1, -1)}
+    run_table_backtest(arrays, outcomes, commission, initial_cash, size_pct, entry_period, 'BOTH', rng=0)
+
+def _warm_hedge(arrays, *params):
+    from hedge_sim import simulate_hedge
+    simulate_hedge(arrays, [0.5], [0.5], 60, 10.0, 0.001, 10, True, 1000.0)
+
+# Motore -> funzione che ne importa il modulo e ne esegue i kernel una volta
+WARMERS = {
+    'backtrader': _warm_backtrader,
+    'numpy': _warm_numpy,
+    'numba': _warm_numba,
+    'events': _warm_events,
+    'book': _warm_book,
+    'table': _warm_table,
+    'hedge': _warm_hedge,
+}
+
+def warm_kernels(params=WARM_PARAMS, engine=None):
+    """Import an engine and run its Numba kernels once on synthetic data.
+
+    Kernels with cache=True are loaded from the on-disk cache, the
+    strategy's calculate_exit_prices_numba (not cached) is compiled; pass
+    the (tp, sl, commission, initial_cash, size_pct, entry_period, max_hold)
+    of the real jobs so the scalar types match. `engine` is a key of
+    WARMERS; None warms every engine.
+    """
+    arrays = synthetic_arrays()
+    for warm in (WARMERS.values() if engine is None else (WARMERS[engine],)):
+        warm(arrays, *params)
+
+def available_cpus():
+    """CPUs this process may run on (affinity mask where the OS has one, e.g. Linux)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _init_warm_worker(specs, warm_params, engine):
+    init_worker(*specs)
+    if warm_params is not None:
+        warm_kernels(warm_params, engine)
+
+def _timed_call(task):
+    func, item = task
+    start = time.perf_counter()
+    result = func(item)
+    return result, time.perf_counter() - start
+
+def _noop(item):
+    return item
+
+def _ready(_):
+    time.sleep(0.01)
+    return os.getpid()
+
+class WorkerPool:
+    """Long-lived Pool whose workers import, warm up and attach the datasets once.
+
+    Every worker runs warm_kernels for `engine` (every engine if None) and
+    attaches the shared copies of `filenames` in its initializer, then serves any number of map calls.
+    map records the time each task spends in the worker, so `last_stats`
+    separates the useful work from the pool overhead (dispatch, pickling,
+    idle workers); measure_overhead times empty tasks.
+    """
+
+    def __init__(self, processes=None, filenames=(), warm_params=WARM_PARAMS, engine=None):
+        self.processes = processes or os.cpu_count()
+        self.datasets = [SharedDataset(filename) for filename in filenames]
+        start = time.perf_counter()
+        self.pool = Pool(self.processes, initializer=_init_warm_worker,
+                         initargs=([dataset.spec for dataset in self.datasets], warm_params, engine))
+        # Il warm-up è terminato quando ogni worker ha risposto almeno una volta
+        ready = set()
+        while len(ready) < self.processes:
+            ready.update(self.pool.map(_ready, range(self.processes), chunksize=1))
+        self.startup_seconds = time.perf_counter() - start
+        self.last_stats = None
+
+    def map(self, func, items, chunksize=None, ordered=False, callback=None):
+        """Run func(item) for every item; results in input order if `ordered`, else as completed.
+
+        `callback` is called with each result as it arrives (progress bars).
+        """
+        items = list(items)
+        if not items:
+            return []
+        if chunksize is None:
+            chunksize = max(1, len(items) // (self.processes * 4))
+        tasks = [(func, item) for item in items]
+        runner = self.pool.imap if ordered else self.pool.imap_unordered
+        start = time.perf_counter()
+        results = []
+        busy = 0.0
+        for result, elapsed in runner(_timed_call, tasks, chunksize=chunksize):
+            results.append(result)
+            busy += elapsed
+            if callback:
+                callback(result)
+        wall = time.perf_counter() - start
+        # Parallelismo reale: con più processi che core il tempo dei task include l'attesa della CPU
+        workers = min(self.processes, len(items), available_cpus())
+        self.last_stats = {
+            'tasks': len(items),
+            'wall_seconds': wall,
+            'busy_seconds': busy,
+            'overhead_ms_per_task': max(wall * workers - busy, 0.0) / len(items) * 1000,
+        }
+        return results
+
+    def measure_overhead(self, tasks=10_000, round_trips=100):
+        """Per-task cost of the pool itself in ms: batched empty tasks and single-task round trips"""
+        stats = self.last_stats
+        self.map(_noop, range(tasks))
+        batched = self.last_stats['wall_seconds'] / tasks * 1000
+        self.last_stats = stats
+        start = time.perf_counter()
+        for _ in range(round_trips):
+            self.pool.apply(_noop, (0,))
+        return {'batched_ms_per_task': batched,
+                'round_trip_ms': (time.perf_counter() - start) / round_trips * 1000}
+
+    def close(self, terminate=False):
+        # terminate: interruzione (errore o Ctrl-C), i task in coda non vanno attesi
+        if terminate:
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()
+        for dataset in self.datasets:
+            dataset.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(terminate=exc_type is not None)